@@ -6,18 +6,47 @@ Supports Synapse Admin API with hooks for Conduit/Dendrite differences.
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
-import json
 import hashlib
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 try:
-    from urllib import quote
+    from urllib import quote, urlencode
 except ImportError:
-    from urllib.parse import quote
-from ansible.module_utils.urls import fetch_url
+    from urllib.parse import quote, urlencode
 from ansible.module_utils.basic import AnsibleModule
 
+try:
+    from ansible_collections.jackaltx.solti_matrix_mgr.plugins.module_utils.matrix_http import (
+        MatrixHTTPBase,
+        _decode_body,
+        _dumps,
+        _loads,
+        _stream_items,
+    )
+except ImportError:
+    # Fallback for local development
+    from ansible.module_utils.matrix_http import MatrixHTTPBase, _decode_body, _dumps, _loads, _stream_items
+
+# Synapse's own page size for the admin rooms listing
+ROOMS_DEFAULT_LIMIT = 100
+
+# Endpoint templates for the per-user admin helpers, filled with a quoted user ID
+USER_ENDPOINTS = {
+    "info": "users/{}",
+    "deactivate": "deactivate/{}",
+    "ratelimit": "users/{}/override_ratelimit",
+}
+
 
-class MatrixAdminAPI:
+@lru_cache(maxsize=4096)
+def _quote_id(identifier):
+    """URL-encode a Matrix ID for use as a path segment (memoized per process)."""
+    return quote(identifier, safe='')
+
+
+class MatrixAdminAPI(MatrixHTTPBase):
     """
     Wrapper for Matrix Admin API calls.
 
@@ -29,6 +58,9 @@ class MatrixAdminAPI:
     SYNAPSE_API_BASE = "/_synapse/admin"
     CLIENT_API_BASE = "/_matrix/client/v3"
 
+    # Cached lookups (users) are reused for this long
+    LOOKUP_CACHE_TTL = 600
+
     def __init__(self, module, homeserver_url, access_token, validate_certs=True, user_id=None, password=None):
         self.module = module
         self.homeserver_url = homeserver_url.rstrip('/')
@@ -37,10 +69,16 @@ class MatrixAdminAPI:
         self.user_id = user_id
         self.password = password
         self.reauthenticated = False
+        self._token_expired = False
+        # Serializes re-logins across bulk worker threads; the version lets a
+        # thread that waited on the lock see that the token was already replaced
+        self._login_lock = threading.Lock()
+        self._token_version = 0
+        self._lookup_cache = {}
 
         # Setup token cache path
         if self.user_id:
-            user_hash = hashlib.md5(self.user_id.encode()).hexdigest()[:8]
+            user_hash = hashlib.blake2b(self.user_id.encode(), digest_size=4).hexdigest()
             self.cache_path = f"/tmp/ansible-matrix-token-{user_hash}"
         else:
             self.cache_path = None
@@ -49,34 +87,14 @@ class MatrixAdminAPI:
         if (not self.access_token or self.access_token == "invalid_token_forced_failure") and self.cache_path:
             self._load_cached_token()
 
-    def _load_cached_token(self):
-        """Try to load token from local /tmp cache."""
-        import os
-        if os.path.exists(self.cache_path):
-            try:
-                with open(self.cache_path, 'r') as f:
-                    cached_token = f.read().strip()
-                    if cached_token:
-                        self.module.debug(f"Loaded token from cache: {self.cache_path}")
-                        self.access_token = cached_token
-            except Exception as e:
-                self.module.warn(f"Failed to read token cache {self.cache_path}: {str(e)}")
-
-    def _save_cached_token(self):
-        """Save current access token to local /tmp cache."""
-        if not self.cache_path or not self.access_token:
-            return
-        import os
-        try:
-            with open(self.cache_path, 'w') as f:
-                f.write(self.access_token)
-            os.chmod(self.cache_path, 0o600)
-        except Exception as e:
-            self.module.warn(f"Failed to write token cache {self.cache_path}: {str(e)}")
+        # Precomputed per instance; headers are rebuilt whenever the token changes
+        self._admin_prefix = f"{self.homeserver_url}{self.SYNAPSE_API_BASE}/"
+        self._client_prefix = f"{self.homeserver_url}{self.CLIENT_API_BASE}/"
+        self._set_auth_headers()
 
     def login(self):
         """Perform a login to obtain a fresh access token."""
-        url = f"{self.homeserver_url}{self.CLIENT_API_BASE}/login"
+        url = f"{self._client_prefix}login"
 
         login_data = {
             "type": "m.login.password",
@@ -89,99 +107,143 @@ class MatrixAdminAPI:
         }
 
         headers = {"Content-Type": "application/json"}
-        body = json.dumps(login_data)
+        body = _dumps(login_data)
 
-        response, info = fetch_url(
-            self.module,
-            url,
-            method="POST",
-            headers=headers,
-            data=body,
-        )
+        status_code, raw, msg = self._send("POST", url, headers, body)
 
-        if info.get('status') == 200 and response:
+        if status_code == 200 and raw:
             try:
-                resp_body = json.loads(response.read())
+                resp_body = _loads(raw)
                 self.access_token = resp_body.get('access_token')
+                self._set_auth_headers()
+                self._token_version += 1
                 self._save_cached_token()
                 return True
             except (ValueError, AttributeError):
                 return False
 
-        self.module.debug(f"Admin login failed: HTTP {info.get('status')} - {info.get('msg', 'No message')}")
+        self.module.debug(f"Admin login failed: HTTP {status_code} - {msg or 'No message'}")
         return False
 
-    def _request(self, method, endpoint, data=None, api_version="v1", retry_auth=True):
-        """Make an authenticated request to the Admin API or Client API."""
+    def _request(self, method, endpoint, data=None, api_version="v1", retry_auth=True, parse_body=True):
+        """
+        Make an authenticated request to the Admin API or Client API.
+
+        With parse_body=False the response body is not decoded and 'body'
+        is None, for callers that only look at the status code.
+        """
+        # Expired cached token: log in now rather than eat a 401 first
+        if self._token_expired and self.user_id and self.password:
+            self._login_if_expired()
+
         if api_version == "client":
-            url = f"{self.homeserver_url}{self.CLIENT_API_BASE}/{endpoint}"
+            url = self._client_prefix + endpoint
+        else:
+            url = f"{self._admin_prefix}{api_version}/{endpoint}"
+
+        if isinstance(data, (bytes, bytearray)):
+            # Already serialized by the caller
+            body = data or None
         else:
-            url = f"{self.homeserver_url}{self.SYNAPSE_API_BASE}/{api_version}/{endpoint}"
+            body = _dumps(data) if data else None
+
+        token_version = self._token_version
+        # Only advertise a JSON content type when there is a body to describe
+        headers = self._base_headers if body is not None else self._auth_headers
 
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
+        status_code, raw, msg = self._send(method, url, headers, body)
+
+        # Handle authentication failure
+        if status_code in [401, 403] and retry_auth:
+            if self.user_id and self.password:
+                self.module.debug(f"Admin auth failure (HTTP {status_code}). Attempting re-authentication for {self.user_id}...")
+                if self._relogin(token_version):
+                    # Retry once with the new token, reusing the built url and body
+                    headers = self._base_headers if body is not None else self._auth_headers
+                    status_code, raw, msg = self._send(method, url, headers, body)
+
+        return {
+            'status_code': status_code,
+            'body': _decode_body(status_code, raw) if parse_body else None,
+            'url': url,
         }
 
-        body = json.dumps(data) if data else None
+    def _request_stream(self, method, endpoint, prefix, api_version="v1", retry_auth=True):
+        """
+        Make an authenticated request and stream items out of the JSON response.
+
+        Args:
+            prefix: ijson prefix of the items to yield (e.g. 'rooms.item')
 
-        response, info = fetch_url(
-            self.module,
-            url,
-            method=method,
-            headers=headers,
-            data=body,
-        )
+        Returns:
+            dict with status_code, items (iterator, empty on error), body (error details), url
+        """
+        # Expired cached token: log in now rather than eat a 401 first
+        if self._token_expired and self.user_id and self.password:
+            self._login_if_expired()
 
-        status_code = info.get('status', -1)
+        if api_version == "client":
+            url = self._client_prefix + endpoint
+        else:
+            url = f"{self._admin_prefix}{api_version}/{endpoint}"
+
+        token_version = self._token_version
+        headers = self._auth_headers
+
+        status_code, fp, raw, msg = self._send_stream(method, url, headers)
 
         # Handle authentication failure
         if status_code in [401, 403] and retry_auth:
             if self.user_id and self.password:
                 self.module.debug(f"Admin auth failure (HTTP {status_code}). Attempting re-authentication for {self.user_id}...")
-                if self.login():
-                    self.reauthenticated = True
+                if self._relogin(token_version):
                     # Retry the request once with new token
-                    return self._request(method, endpoint, data=data, api_version=api_version, retry_auth=False)
+                    status_code, fp, raw, msg = self._send_stream(method, url, self._auth_headers)
 
-        if response:
-            try:
-                body = json.loads(response.read())
-            except (ValueError, AttributeError):
-                body = {}
-        else:
-            body = {}
-            if 'body' in info:
-                try:
-                    body = json.loads(info['body'])
-                except ValueError:
-                    body = {'raw': info.get('body', '')}
+        if fp is None:
+            return {
+                'status_code': status_code,
+                'items': iter(()),
+                'body': _decode_body(status_code, raw),
+                'url': url,
+            }
 
         return {
             'status_code': status_code,
-            'body': body,
+            'items': _stream_items(fp, prefix),
+            'body': {},
             'url': url,
         }
 
     def get(self, endpoint, api_version="v1"):
         return self._request("GET", endpoint, api_version=api_version)
 
-    def post(self, endpoint, data=None, api_version="v1"):
-        return self._request("POST", endpoint, data=data, api_version=api_version)
+    def post(self, endpoint, data=None, api_version="v1", parse_body=True):
+        return self._request("POST", endpoint, data=data, api_version=api_version, parse_body=parse_body)
 
     def put(self, endpoint, data=None, api_version="v1"):
         return self._request("PUT", endpoint, data=data, api_version=api_version)
 
-    def delete(self, endpoint, data=None, api_version="v1"):
-        return self._request("DELETE", endpoint, data=data, api_version=api_version)
+    def delete(self, endpoint, data=None, api_version="v1", parse_body=True):
+        return self._request("DELETE", endpoint, data=data, api_version=api_version, parse_body=parse_body)
 
 
 # User management helpers
 def get_user_info(api, user_id):
-    """Get user details. Returns None if user doesn't exist."""
-    encoded_user_id = quote(user_id, safe='')
-    result = api.get(f"users/{encoded_user_id}", api_version="v2")
+    """
+    Get user details. Returns None if user doesn't exist.
+
+    Found users are cached on the api instance; the write helpers below
+    refresh or drop the entry.
+    """
+    cached = api._lookup_cache.get(('user', user_id))
+    if cached and cached[0] > time.time():
+        return cached[1]
+
+    encoded_user_id = _quote_id(user_id)
+    result = api.get(USER_ENDPOINTS["info"].format(encoded_user_id), api_version="v2")
     if result['status_code'] == 200:
+        api._lookup_cache[('user', user_id)] = (time.time() + api.LOOKUP_CACHE_TTL, result['body'])
         return result['body']
     elif result['status_code'] == 404:
         return None
@@ -202,16 +264,23 @@ def create_or_update_user(api, user_id, password=None, displayname=None, admin=F
     if user_type is not None:
         data["user_type"] = user_type
 
-    encoded_user_id = quote(user_id, safe='')
-    result = api.put(f"users/{encoded_user_id}", data=data, api_version="v2")
+    encoded_user_id = _quote_id(user_id)
+    result = api.put(USER_ENDPOINTS["info"].format(encoded_user_id), data=data, api_version="v2")
+    body = result['body']
+    if result['status_code'] in (200, 201) and isinstance(body, dict) and 'name' in body:
+        # The PUT answers with the full user record
+        api._lookup_cache[('user', user_id)] = (time.time() + api.LOOKUP_CACHE_TTL, body)
+    else:
+        api._lookup_cache.pop(('user', user_id), None)
     return result
 
 
 def deactivate_user(api, user_id, erase=False):
     """Deactivate a user account."""
     data = {"erase": erase}
-    encoded_user_id = quote(user_id, safe='')
-    result = api.post(f"deactivate/{encoded_user_id}", data=data)
+    encoded_user_id = _quote_id(user_id)
+    result = api.post(USER_ENDPOINTS["deactivate"].format(encoded_user_id), data=data)
+    api._lookup_cache.pop(('user', user_id), None)
     return result
 
 
@@ -226,16 +295,41 @@ def get_room_info(api, room_id):
     return {'error': result['body'], 'status': result['status_code']}
 
 
-def list_rooms(api, limit=100, search_term=None):
-    """List rooms with optional search."""
-    endpoint = f"rooms?limit={limit}"
+def list_rooms(api, limit=ROOMS_DEFAULT_LIMIT, search_term=None, stream=False):
+    """
+    List rooms with optional search.
+
+    With stream=True the result carries an 'items' iterator of rooms
+    instead of a parsed 'body'.
+    """
+    params = {}
+    if limit != ROOMS_DEFAULT_LIMIT:
+        params['limit'] = limit
     if search_term:
-        endpoint += f"&search_term={search_term}"
+        params['search_term'] = search_term
+    endpoint = "rooms"
+    if params:
+        endpoint += "?" + urlencode(params)
+    if stream:
+        return api._request_stream("GET", endpoint, 'rooms.item')
     return api.get(endpoint)
 
 
-def get_room_members(api, room_id):
-    """Get room members list."""
+def get_room_members(api, room_id, stream=False):
+    """
+    Get room members list.
+
+    With stream=True an iterator over member IDs is returned in place of
+    the response body.
+    """
+    if stream:
+        result = api._request_stream("GET", f"rooms/{room_id}/members", 'members.item')
+        if result['status_code'] == 200:
+            return result['items']
+        elif result['status_code'] == 404:
+            return None
+        return {'error': result['body'], 'status': result['status_code']}
+
     result = api.get(f"rooms/{room_id}/members")
     if result['status_code'] == 200:
         return result['body']
@@ -265,15 +359,15 @@ def set_ratelimit_override(api, user_id, messages_per_second=0, burst_count=0):
         "messages_per_second": messages_per_second,
         "burst_count": burst_count,
     }
-    encoded_user_id = quote(user_id, safe='')
-    result = api.post(f"users/{encoded_user_id}/override_ratelimit", data=data)
+    encoded_user_id = _quote_id(user_id)
+    result = api.post(USER_ENDPOINTS["ratelimit"].format(encoded_user_id), data=data)
     return result
 
 
 def delete_ratelimit_override(api, user_id):
     """Remove rate limit override, restoring default limits."""
-    encoded_user_id = quote(user_id, safe='')
-    result = api.delete(f"users/{encoded_user_id}/override_ratelimit")
+    encoded_user_id = _quote_id(user_id)
+    result = api.delete(USER_ENDPOINTS["ratelimit"].format(encoded_user_id))
     return result
 
 
@@ -301,5 +395,67 @@ def list_registration_tokens(api, valid=None):
     """List registration tokens."""
     endpoint = "registration_tokens"
     if valid is not None:
-        endpoint += f"?valid={'true' if valid else 'false'}"
+        endpoint += "?" + urlencode({'valid': 'true' if valid else 'false'})
     return api.get(endpoint)
+
+
+# Pagination
+def paginate(api, endpoint, params=None, page_size=100, api_version="v1"):
+    """
+    Walk a paginated admin list endpoint one page at a time.
+
+    Follows next_token (users) or next_batch (rooms) through the 'from'
+    parameter, so only one page is held at a time and a caller that stops
+    iterating stops fetching.
+
+    Yields:
+        dict: Each page's result as returned by api.get(); iteration ends
+        after the last page or after a page that isn't HTTP 200
+    """
+    params = dict(params or {}, limit=page_size)
+    while True:
+        result = api.get(f"{endpoint}?{urlencode(params, doseq=True)}", api_version=api_version)
+        yield result
+        if result['status_code'] != 200:
+            return
+        body = result['body']
+        next_from = body.get('next_token', body.get('next_batch'))
+        if next_from is None:
+            return
+        params['from'] = next_from
+
+
+# Bulk operations
+def bulk_apply(api, operations, max_workers=8):
+    """
+    Run independent helper calls concurrently over the shared session.
+
+    Args:
+        api: MatrixAdminAPI instance
+        operations: list of (helper, args, kwargs) tuples; each helper is
+            called as helper(api, *args, **kwargs)
+        max_workers: Maximum concurrent requests (keep <= session pool size)
+
+    Returns:
+        list: Helper results, in the same order as operations
+    """
+    if not operations:
+        return []
+
+    def _call(operation):
+        helper, args, kwargs = operation
+        return helper(api, *args, **(kwargs or {}))
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(operations))) as executor:
+        return list(executor.map(_call, operations))
+
+
+def bulk_get_users(api, user_ids, max_workers=8):
+    """
+    Fetch many users concurrently.
+
+    Returns:
+        dict: user_id -> get_user_info() result (None for unknown users)
+    """
+    results = bulk_apply(api, [(get_user_info, (user_id,), None) for user_id in user_ids], max_workers=max_workers)
+    return dict(zip(user_ids, results))
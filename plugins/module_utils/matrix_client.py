@@ -6,15 +6,37 @@ Provides wrapper for posting events and messages to Matrix rooms.
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
-import json
+import os
+import threading
 import time
 import hashlib
 import random
-from ansible.module_utils.urls import fetch_url
+try:
+    from urllib import quote
+except ImportError:
+    from urllib.parse import quote
 from ansible.module_utils.basic import AnsibleModule
 
+try:
+    from ansible_collections.jackaltx.solti_matrix_mgr.plugins.module_utils.matrix_http import (
+        MatrixHTTPBase,
+        _decode_body,
+        _dumps,
+        _loads,
+        _stream_items,
+    )
+except ImportError:
+    # Fallback for local development
+    from ansible.module_utils.matrix_http import MatrixHTTPBase, _decode_body, _dumps, _loads, _stream_items
 
-class MatrixClientAPI:
+# Private generator: avoids contending on the random module's shared instance
+_rng = random.Random()
+
+# Transaction ID template, bound once so each ID is a single format call
+_TXN_ID_FORMAT = "ansible-{}-{}-{}".format
+
+
+class MatrixClientAPI(MatrixHTTPBase):
     """
     Wrapper for Matrix Client-Server API calls.
 
@@ -46,10 +68,15 @@ class MatrixClientAPI:
         self.user_id = user_id
         self.password = password
         self.reauthenticated = False
+        self._token_expired = False
+        # Serializes re-logins across bulk worker threads; the version lets a
+        # thread that waited on the lock see that the token was already replaced
+        self._login_lock = threading.Lock()
+        self._token_version = 0
 
         # Setup token cache path
         if self.user_id:
-            user_hash = hashlib.md5(self.user_id.encode()).hexdigest()[:8]
+            user_hash = hashlib.blake2b(self.user_id.encode(), digest_size=4).hexdigest()
             self.cache_path = f"/tmp/ansible-matrix-token-{user_hash}"
         else:
             self.cache_path = None
@@ -58,30 +85,9 @@ class MatrixClientAPI:
         if (not self.access_token or self.access_token == "invalid_token_forced_failure") and self.cache_path:
             self._load_cached_token()
 
-    def _load_cached_token(self):
-        """Try to load token from local /tmp cache."""
-        import os
-        if os.path.exists(self.cache_path):
-            try:
-                with open(self.cache_path, 'r') as f:
-                    cached_token = f.read().strip()
-                    if cached_token:
-                        self.module.debug(f"Loaded token from cache: {self.cache_path}")
-                        self.access_token = cached_token
-            except Exception as e:
-                self.module.warn(f"Failed to read token cache {self.cache_path}: {str(e)}")
-
-    def _save_cached_token(self):
-        """Save current access token to local /tmp cache."""
-        if not self.cache_path or not self.access_token:
-            return
-        import os
-        try:
-            with open(self.cache_path, 'w') as f:
-                f.write(self.access_token)
-            os.chmod(self.cache_path, 0o600)
-        except Exception as e:
-            self.module.warn(f"Failed to write token cache {self.cache_path}: {str(e)}")
+        # Precomputed per instance; headers are rebuilt whenever the token changes
+        self._client_prefix = f"{self.homeserver_url}{self.CLIENT_API_BASE}/"
+        self._set_auth_headers()
 
     def _request(self, method, endpoint, data=None, retry_auth=True):
         """
@@ -90,56 +96,89 @@ class MatrixClientAPI:
         Args:
             method: HTTP method (GET, POST, PUT, DELETE)
             endpoint: API endpoint (without /v3 prefix)
-            data: Optional dict to send as JSON body
+            data: Optional dict to send as JSON body, or pre-serialized JSON bytes
             retry_auth: Whether to attempt re-authentication on 401/403
 
         Returns:
             dict with status_code, body, url
         """
-        url = f"{self.homeserver_url}{self.CLIENT_API_BASE}/{endpoint}"
+        # Expired cached token: log in now rather than eat a 401 first
+        if self._token_expired and self.user_id and self.password:
+            self._login_if_expired()
+
+        url = self._client_prefix + endpoint
+
+        if isinstance(data, (bytes, bytearray)):
+            # Already serialized by the caller
+            body = data or None
+        else:
+            body = _dumps(data) if data else None
+
+        token_version = self._token_version
+        # Only advertise a JSON content type when there is a body to describe
+        headers = self._base_headers if body is not None else self._auth_headers
 
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
+        status_code, raw, msg = self._send(method, url, headers, body)
+
+        # Handle authentication failure
+        if status_code in [401, 403] and retry_auth:
+            if self.user_id and self.password:
+                self.module.debug(f"Auth failure (HTTP {status_code}). Attempting re-authentication for {self.user_id}...")
+                if self._relogin(token_version):
+                    # Retry once with the new token, reusing the built url and body
+                    headers = self._base_headers if body is not None else self._auth_headers
+                    status_code, raw, msg = self._send(method, url, headers, body)
+
+        return {
+            'status_code': status_code,
+            'body': _decode_body(status_code, raw),
+            'url': url,
         }
 
-        body = json.dumps(data) if data else None
+    def _request_stream(self, method, endpoint, prefix, retry_auth=True):
+        """
+        Make an authenticated request and stream items out of the JSON response.
 
-        response, info = fetch_url(
-            self.module,
-            url,
-            method=method,
-            headers=headers,
-            data=body,
-        )
+        Args:
+            method: HTTP method
+            endpoint: API endpoint (without /v3 prefix)
+            prefix: ijson prefix of the items to yield (e.g. 'item' for a top-level list)
+            retry_auth: Whether to attempt re-authentication on 401/403
 
-        status_code = info.get('status', -1)
+        Returns:
+            dict with status_code, items (iterator, empty on error), body (error details), url
+        """
+        # Expired cached token: log in now rather than eat a 401 first
+        if self._token_expired and self.user_id and self.password:
+            self._login_if_expired()
+
+        url = self._client_prefix + endpoint
+
+        token_version = self._token_version
+        headers = self._auth_headers
+
+        status_code, fp, raw, msg = self._send_stream(method, url, headers)
 
         # Handle authentication failure
         if status_code in [401, 403] and retry_auth:
             if self.user_id and self.password:
                 self.module.debug(f"Auth failure (HTTP {status_code}). Attempting re-authentication for {self.user_id}...")
-                if self.login():
-                    self.reauthenticated = True
+                if self._relogin(token_version):
                     # Retry the request once with new token
-                    return self._request(method, endpoint, data=data, retry_auth=False)
+                    status_code, fp, raw, msg = self._send_stream(method, url, self._auth_headers)
 
-        if response:
-            try:
-                body = json.loads(response.read())
-            except (ValueError, AttributeError):
-                body = {}
-        else:
-            body = {}
-            if 'body' in info:
-                try:
-                    body = json.loads(info['body'])
-                except ValueError:
-                    body = {'raw': info.get('body', '')}
+        if fp is None:
+            return {
+                'status_code': status_code,
+                'items': iter(()),
+                'body': _decode_body(status_code, raw),
+                'url': url,
+            }
 
         return {
             'status_code': status_code,
-            'body': body,
+            'items': _stream_items(fp, prefix),
+            'body': {},
             'url': url,
         }
 
@@ -152,7 +191,7 @@ class MatrixClientAPI:
         Returns:
             bool: True if login was successful, False otherwise
         """
-        url = f"{self.homeserver_url}{self.CLIENT_API_BASE}/login"
+        url = f"{self._client_prefix}login"
 
         login_data = {
             "type": "m.login.password",
@@ -165,27 +204,23 @@ class MatrixClientAPI:
         }
 
         headers = {"Content-Type": "application/json"}
-        body = json.dumps(login_data)
+        body = _dumps(login_data)
 
-        response, info = fetch_url(
-            self.module,
-            url,
-            method="POST",
-            headers=headers,
-            data=body,
-        )
+        status_code, raw, msg = self._send("POST", url, headers, body)
 
-        if info.get('status') == 200 and response:
+        if status_code == 200 and raw:
             try:
-                resp_body = json.loads(response.read())
+                resp_body = _loads(raw)
                 self.access_token = resp_body.get('access_token')
+                self._set_auth_headers()
+                self._token_version += 1
                 self._save_cached_token()
                 return True
             except (ValueError, AttributeError):
                 return False
 
         # Log failure details
-        self.module.debug(f"Login failed: HTTP {info.get('status')} - {info.get('msg', 'No message')}")
+        self.module.debug(f"Login failed: HTTP {status_code} - {msg or 'No message'}")
         return False
 
     def get(self, endpoint):
@@ -209,11 +244,12 @@ class MatrixClientAPI:
         Args:
             room_id: Room ID (!xxx:server.com) or alias (#xxx:server.com)
             event_type: Event type (e.g., 'com.solti.verify.fail')
-            content: Event content dict
+            content: Event content dict, or the same already serialized to JSON bytes
             transaction_id: Optional transaction ID for idempotency
 
         Returns:
-            dict with status_code, body (contains event_id on success)
+            dict with status_code, body (contains event_id on success), and
+            the transaction_id actually used
         """
         # Resolve room alias to ID if needed
         if room_id.startswith('#'):
@@ -228,7 +264,9 @@ class MatrixClientAPI:
             transaction_id = self._generate_transaction_id(room_id, event_type)
 
         endpoint = f"rooms/{room_id}/send/{event_type}/{transaction_id}"
-        return self.put(endpoint, data=content)
+        result = self.put(endpoint, data=content)
+        result['transaction_id'] = transaction_id
+        return result
 
     def send_message(self, room_id, msgtype, body, formatted_body=None):
         """
@@ -267,12 +305,11 @@ class MatrixClientAPI:
             dict with status_code, body (contains room_id on success)
         """
         # URL encode the room alias
-        import urllib.parse
-        encoded_alias = urllib.parse.quote(room_alias, safe='')
+        encoded_alias = quote(room_alias, safe='')
         endpoint = f"directory/room/{encoded_alias}"
         return self.get(endpoint)
 
-    def get_room_state(self, room_id):
+    def get_room_state(self, room_id, stream=False):
         """
         Get all state events for a room.
 
@@ -280,19 +317,25 @@ class MatrixClientAPI:
 
         Args:
             room_id: Room ID
+            stream: Yield state events one at a time instead of parsing the whole list
 
         Returns:
-            dict with status_code, body (list of state events on success)
+            dict with status_code, body (list of state events on success),
+            or status_code, items (state event iterator) when stream=True
         """
         endpoint = f"rooms/{room_id}/state"
+        if stream:
+            return self._request_stream("GET", endpoint, 'item')
         return self.get(endpoint)
 
     def _generate_transaction_id(self, room_id, event_type):
         """
         Generate a unique transaction ID for event idempotency.
 
-        Uses timestamp + random component + room_id + event_type hash to ensure uniqueness
-        even when multiple events are sent in rapid succession.
+        Uses timestamp + random component + 4 random bytes to ensure uniqueness
+        even when multiple events are sent in rapid succession. Transaction
+        IDs are scoped per access token, so room_id and event_type are not
+        needed to disambiguate.
 
         Args:
             room_id: Room ID
@@ -301,11 +344,8 @@ class MatrixClientAPI:
         Returns:
             str: Transaction ID
         """
-        timestamp = str(int(time.time() * 1000))  # milliseconds
-        random_component = random.randint(1000, 9999)
-        unique_str = f"{timestamp}-{random_component}-{room_id}-{event_type}"
-        hash_suffix = hashlib.md5(unique_str.encode()).hexdigest()[:8]
-        return f"ansible-{timestamp}-{random_component}-{hash_suffix}"
+        # ansible-<milliseconds>-<4 digits>-<8 hex chars>, built in one pass
+        return _TXN_ID_FORMAT(time.time_ns() // 1_000_000, _rng.randrange(1000, 10000), os.urandom(4).hex())
 
 
 # Helper functions for common operations
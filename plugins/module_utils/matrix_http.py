@@ -0,0 +1,398 @@
+"""
+HTTP transport shared by the Matrix Admin and Client-Server API wrappers.
+
+Provides the pooled keep-alive session (with a fetch_url fallback),
+response decoding/streaming and the token cache and re-login plumbing
+common to MatrixAdminAPI and MatrixClientAPI.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import gzip
+import json
+import os
+import time
+from ansible.module_utils.urls import fetch_url
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util import Retry, make_headers
+    HAS_REQUESTS = True
+except ImportError:
+    HAS_REQUESTS = False
+
+try:
+    import zstandard
+    HAS_ZSTANDARD = True
+except ImportError:
+    HAS_ZSTANDARD = False
+
+USER_AGENT = "solti-matrix-mgr/0.1.0"
+
+# Transient statuses retried by the pooled session, with backoff
+_RETRY_STATUSES = (429, 502, 503, 504)
+
+# Encodings the fetch_url path can undo (requests negotiates its own)
+_ACCEPT_ENCODING = "zstd, gzip" if HAS_ZSTANDARD else "gzip"
+
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    try:
+        import msgspec
+        _dumps = msgspec.json.encode
+        # A reusable decoder instance skips per-call setup
+        _loads = msgspec.json.Decoder().decode
+    except ImportError:
+        try:
+            import ujson
+
+            def _dumps(obj):
+                return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+            _loads = ujson.loads
+        except ImportError:
+            def _dumps(obj):
+                return json.dumps(obj).encode('utf-8')
+            _loads = json.loads
+
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+
+# fetch_url bodies up to this size are read into a preallocated buffer
+_SMALL_BODY_MAX = 16 * 1024
+
+# Keep-alive sessions shared by every API instance in this process,
+# keyed by (homeserver_url, validate_certs).
+_SESSIONS = {}
+
+
+def _read_body(response, info):
+    """
+    Read a fetch_url response body.
+
+    Small uncompressed bodies with a known Content-Length are read straight
+    into one preallocated buffer instead of going through read()'s copies.
+    """
+    try:
+        length = int(info.get('content-length', -1))
+    except (TypeError, ValueError):
+        length = -1
+    if (0 <= length <= _SMALL_BODY_MAX and not info.get('content-encoding')
+            and hasattr(response, 'readinto')):
+        buf = bytearray(length)
+        view = memoryview(buf)
+        received = 0
+        while received < length:
+            count = response.readinto(view[received:])
+            if not count:
+                break
+            received += count
+        return buf if received == length else buf[:received]
+    return response.read()
+
+
+def _decompress(raw, encoding):
+    """Undo a Content-Encoding the transport left in place."""
+    if not raw or not encoding:
+        return raw
+    encoding = encoding.lower()
+    if encoding == 'gzip':
+        return gzip.decompress(raw)
+    if encoding == 'zstd' and HAS_ZSTANDARD:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(bytes(raw))
+    return raw
+
+
+def _decode_body(status_code, raw):
+    """Decode a JSON response body, mirroring fetch_url's success/error split."""
+    if not raw:
+        return {}
+    try:
+        return _loads(raw)
+    except ValueError:
+        if status_code >= 400:
+            return {'raw': raw.decode('utf-8', 'replace') if isinstance(raw, (bytes, bytearray)) else raw}
+        return {}
+
+
+def _walk_prefix(node, parts):
+    """Yield the values at an ijson-style prefix path within a parsed document."""
+    if not parts:
+        yield node
+    elif parts[0] == 'item':
+        if isinstance(node, list):
+            for child in node:
+                for value in _walk_prefix(child, parts[1:]):
+                    yield value
+    elif isinstance(node, dict) and parts[0] in node:
+        for value in _walk_prefix(node[parts[0]], parts[1:]):
+            yield value
+
+
+def _stream_items(fp, prefix):
+    """
+    Yield items under prefix (e.g. 'rooms.item') from a response file object.
+
+    With ijson the body is parsed incrementally, one item at a time;
+    otherwise it is read and parsed whole. The connection is released once
+    the generator is exhausted or closed.
+    """
+    try:
+        if HAS_IJSON:
+            for item in ijson.items(fp, prefix, use_float=True):
+                yield item
+        else:
+            parts = prefix.split('.') if prefix else []
+            for item in _walk_prefix(_loads(fp.read()), parts):
+                yield item
+    finally:
+        if hasattr(fp, 'release_conn'):
+            # urllib3 response from a pooled session: keep the socket alive
+            fp.drain_conn()
+            fp.release_conn()
+        else:
+            fp.close()
+
+
+class MatrixHTTPBase:
+    """
+    Transport, token cache and re-login helpers shared by the API wrappers.
+
+    Subclasses set module, homeserver_url, access_token, validate_certs,
+    user_id, password, cache_path, _client_prefix and the login
+    lock/version attributes in __init__, and implement login().
+    """
+
+    # Cached tokens older than this trigger a login before the first request
+    TOKEN_CACHE_TTL = 20 * 60
+
+    def _set_auth_headers(self):
+        """(Re)build the static request headers for the current access token."""
+        authorization = f"Bearer {self.access_token}"
+        self._auth_headers = {"Authorization": authorization}
+        if not HAS_REQUESTS:
+            # urllib sends no Accept-Encoding of its own
+            self._auth_headers["Accept-Encoding"] = _ACCEPT_ENCODING
+            self._auth_headers["User-Agent"] = USER_AGENT
+        self._base_headers = dict(self._auth_headers)
+        self._base_headers["Content-Type"] = "application/json"
+
+    def _load_cached_token(self):
+        """
+        Try to load token from local /tmp cache.
+
+        The cache holds {"token": ..., "saved_at": ...}. A token past
+        TOKEN_CACHE_TTL is still loaded, but flagged so _request logs in
+        up front instead of waiting for a 401. Legacy plain-text caches
+        have no timestamp and are used as-is.
+        """
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, 'r') as f:
+                    raw = f.read().strip()
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    entry = None
+                if not isinstance(entry, dict):
+                    entry = {'token': raw}
+                cached_token = entry.get('token')
+                if cached_token:
+                    self.module.debug(f"Loaded token from cache: {self.cache_path}")
+                    self.access_token = cached_token
+                    saved_at = entry.get('saved_at')
+                    if saved_at is not None and time.time() - saved_at >= self.TOKEN_CACHE_TTL:
+                        self.module.debug(f"Cached token is older than {self.TOKEN_CACHE_TTL}s")
+                        self._token_expired = True
+            except Exception as e:
+                self.module.warn(f"Failed to read token cache {self.cache_path}: {str(e)}")
+
+    def _save_cached_token(self):
+        """Save current access token to local /tmp cache."""
+        if not self.cache_path or not self.access_token:
+            return
+        try:
+            with open(self.cache_path, 'w') as f:
+                f.write(json.dumps({"token": self.access_token, "saved_at": time.time()}))
+            os.chmod(self.cache_path, 0o600)
+        except Exception as e:
+            self.module.warn(f"Failed to write token cache {self.cache_path}: {str(e)}")
+
+    def _get_session(self):
+        """
+        Return the pooled keep-alive session for this homeserver.
+
+        Sessions are cached per (homeserver_url, validate_certs) so every
+        request in the process reuses the same TCP+TLS connection. Returns
+        None when requests is unavailable (falls back to fetch_url).
+        """
+        if not HAS_REQUESTS:
+            return None
+        key = (self.homeserver_url, self.validate_certs)
+        session = _SESSIONS.get(key)
+        if session is None:
+            session = requests.Session()
+            # Reads only: a retried PUT or DELETE could repeat a change the
+            # server already applied. Retry-After is ignored so a server
+            # asking for a long wait can't stall the task; the short backoff
+            # applies instead. The last response is returned rather than
+            # raised once retries run out.
+            retries = Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=_RETRY_STATUSES,
+                allowed_methods=frozenset({'GET'}),
+                respect_retry_after_header=False,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=retries)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['Connection'] = 'keep-alive'
+            session.headers['User-Agent'] = USER_AGENT
+            # Advertise every encoding urllib3 can decode (br/zstd when installed)
+            session.headers['Accept-Encoding'] = make_headers(accept_encoding=True)['accept-encoding']
+            # Another thread may have created one meanwhile; keep a single session
+            session = _SESSIONS.setdefault(key, session)
+        return session
+
+    def close(self):
+        """Close this homeserver's pooled session; a later request opens a new one."""
+        session = _SESSIONS.pop((self.homeserver_url, self.validate_certs), None)
+        if session is not None:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _send(self, method, url, headers, body=None):
+        """
+        Send a raw HTTP request.
+
+        Returns:
+            tuple: (status_code, raw_body, msg) - status_code is -1 on connection failure
+        """
+        session = self._get_session()
+        if session is None:
+            response, info = fetch_url(
+                self.module,
+                url,
+                method=method,
+                headers=headers,
+                data=body,
+            )
+            encoding = info.get('content-encoding')
+            if 'body' in info:
+                # Error bodies are returned as sent, still compressed
+                raw = _decompress(info['body'], encoding)
+            else:
+                raw = _read_body(response, info) if response else None
+                # fetch_url already gunzips successful responses
+                if encoding and encoding.lower() != 'gzip':
+                    raw = _decompress(raw, encoding)
+            return info.get('status', -1), raw, info.get('msg', '')
+
+        try:
+            resp = session.request(
+                method,
+                url,
+                headers=headers,
+                data=body,
+                verify=self.validate_certs,
+                timeout=30,
+            )
+        except requests.RequestException as e:
+            return -1, None, f"Request failed: {str(e)}"
+        return resp.status_code, resp.content, resp.reason
+
+    def _send_stream(self, method, url, headers):
+        """
+        Like _send, but leave a successful (HTTP 200) response body unread.
+
+        Returns:
+            tuple: (status_code, fp, raw_body, msg) - fp is a readable file
+            object on HTTP 200 (raw_body is None), otherwise fp is None
+        """
+        session = self._get_session()
+        if session is None:
+            response, info = fetch_url(
+                self.module,
+                url,
+                method=method,
+                headers=headers,
+            )
+            status_code = info.get('status', -1)
+            encoding = info.get('content-encoding')
+            if status_code == 200 and response:
+                if encoding and encoding.lower() == 'zstd' and HAS_ZSTANDARD:
+                    response = zstandard.ZstdDecompressor().stream_reader(response)
+                return status_code, response, None, info.get('msg', '')
+            return status_code, None, _decompress(info.get('body'), encoding), info.get('msg', '')
+
+        try:
+            resp = session.request(
+                method,
+                url,
+                headers=headers,
+                verify=self.validate_certs,
+                timeout=30,
+                stream=True,
+            )
+        except requests.RequestException as e:
+            return -1, None, None, f"Request failed: {str(e)}"
+        if resp.status_code == 200:
+            resp.raw.decode_content = True
+            return resp.status_code, resp.raw, None, resp.reason
+        return resp.status_code, None, resp.content, resp.reason
+
+    def _login_if_expired(self):
+        """
+        Log in once for an expired cached token, even with concurrent callers.
+
+        The cached token came from an earlier login by this collection, so
+        its device is logged out once the new login succeeds; otherwise each
+        expiry would leave another device on the account.
+        """
+        with self._login_lock:
+            if self._token_expired:
+                self._token_expired = False
+                old_token = self.access_token
+                if self.login():
+                    self.reauthenticated = True
+                    self._logout_token(old_token)
+
+    def _logout_token(self, token):
+        """Log out the device behind a replaced access token (best effort)."""
+        if not token or token == self.access_token:
+            return
+        headers = dict(self._base_headers)
+        headers["Authorization"] = f"Bearer {token}"
+        status_code, raw, msg = self._send("POST", self._client_prefix + "logout", headers, b"{}")
+        if status_code != 200:
+            self.module.debug(f"Logout of replaced token failed: HTTP {status_code} - {msg or 'No message'}")
+
+    def _relogin(self, seen_version):
+        """
+        Log in again after an auth failure with token version seen_version.
+
+        If another thread already replaced the token while this one waited
+        on the lock, its token is reused instead of logging in a second time.
+        """
+        with self._login_lock:
+            if self._token_version != seen_version:
+                return True
+            if self.login():
+                self.reauthenticated = True
+                return True
+            return False
@@ -16,7 +16,9 @@ from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
 import time
-from datetime import datetime
+
+# ISO 8601 UTC, e.g. "2026-02-11T15:30:45Z"
+_ISO_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
 
 
 def create_solti_event(schema, data, source=None):
@@ -51,7 +53,7 @@ def create_solti_event(schema, data, source=None):
         "body": f"SOLTI event: {schema}",
         "solti": {
             "schema": schema,
-            "timestamp": _iso_timestamp(),
+            "timestamp": time.strftime(_ISO_FORMAT, time.gmtime()),
             "source": source or "unknown",
             "data": data
         }
@@ -72,17 +74,16 @@ def _generate_body(schema, data):
     Note:
         Falls back to generic format if schema unknown.
     """
-    if schema == "verify.fail.v1":
-        return _body_verify_fail(data)
-    elif schema == "verify.pass.v1":
-        return _body_verify_pass(data)
-    elif schema == "deploy.start.v1":
-        return _body_deploy_start(data)
-    elif schema == "deploy.complete.v1":
-        return _body_deploy_complete(data)
-    else:
+    builder = _BODY_BUILDERS.get(schema)
+    if builder is None:
         # Generic fallback for unknown schemas
-        return f"📋 SOLTI Event: {schema}"
+        return _body_generic(data, schema)
+    return builder(data)
+
+
+def _body_generic(data, schema):
+    """Generate body for schemas without a dedicated builder."""
+    return f"📋 SOLTI Event: {schema}"
 
 
 def _body_verify_fail(data):
@@ -145,6 +146,15 @@ def _body_deploy_complete(data):
         return f"📋 Deployment {status.upper()}: {service} on {host}"
 
 
+# Body builder per schema, looked up once per event by _generate_body
+_BODY_BUILDERS = {
+    "verify.fail.v1": _body_verify_fail,
+    "verify.pass.v1": _body_verify_pass,
+    "deploy.start.v1": _body_deploy_start,
+    "deploy.complete.v1": _body_deploy_complete,
+}
+
+
 def _iso_timestamp():
     """
     Generate ISO 8601 timestamp in UTC.
@@ -152,7 +162,40 @@ def _iso_timestamp():
     Returns:
         str: Timestamp in format "2026-02-11T15:30:45Z"
     """
-    return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    return time.strftime(_ISO_FORMAT, time.gmtime())
+
+
+# Required field paths per schema, pre-split into key tuples
+# (e.g. ("summary", "total_services") for "summary.total_services")
+_VERIFY_FIELDS = (
+    ("distribution",),
+    ("hostname",),
+    ("summary",),
+    ("summary", "total_services"),
+    ("summary", "failed_services"),
+    ("summary", "passed_services"),
+    ("services",),
+    ("failed_service_names",),
+)
+
+_DEPLOY_START_FIELDS = (
+    ("service",),
+    ("host",),
+    ("playbook",),
+    ("operator",),
+)
+
+_DEPLOY_COMPLETE_FIELDS = _DEPLOY_START_FIELDS + (
+    ("duration",),
+    ("status",),
+)
+
+_REQUIRED_FIELDS = {
+    "verify.fail.v1": _VERIFY_FIELDS,
+    "verify.pass.v1": _VERIFY_FIELDS,
+    "deploy.start.v1": _DEPLOY_START_FIELDS,
+    "deploy.complete.v1": _DEPLOY_COMPLETE_FIELDS,
+}
 
 
 def validate_schema_data(schema, data):
@@ -171,56 +214,41 @@ def validate_schema_data(schema, data):
         >>> if not valid:
         ...     print(f"Missing fields: {missing}")
     """
-    required_fields = _get_required_fields(schema)
-    missing_fields = []
+    missing_fields = [
+        '.'.join(path) for path in _get_required_fields(schema) if not _has_nested_field(data, path)
+    ]
+    return (len(missing_fields) == 0, missing_fields)
 
-    for field_path in required_fields:
-        if not _has_nested_field(data, field_path):
-            missing_fields.append(field_path)
 
-    return (len(missing_fields) == 0, missing_fields)
+def is_valid_schema_data(schema, data):
+    """
+    Check whether data contains every required field for schema.
+
+    Pass/fail counterpart of validate_schema_data: stops at the first
+    missing field instead of collecting all of them.
+
+    Args:
+        schema (str): Schema identifier
+        data (dict): Data to validate
+
+    Returns:
+        bool: True if all required fields are present
+    """
+    return all(_has_nested_field(data, path) for path in _get_required_fields(schema))
 
 
 def _get_required_fields(schema):
     """
-    Get list of required field paths for a schema.
+    Get required field paths for a schema.
 
     Args:
         schema (str): Schema identifier
 
     Returns:
-        list: List of required field paths (supports dot notation for nested)
-    """
-    if schema in ["verify.fail.v1", "verify.pass.v1"]:
-        return [
-            "distribution",
-            "hostname",
-            "summary",
-            "summary.total_services",
-            "summary.failed_services",
-            "summary.passed_services",
-            "services",
-            "failed_service_names"
-        ]
-    elif schema == "deploy.start.v1":
-        return [
-            "service",
-            "host",
-            "playbook",
-            "operator"
-        ]
-    elif schema == "deploy.complete.v1":
-        return [
-            "service",
-            "host",
-            "playbook",
-            "operator",
-            "duration",
-            "status"
-        ]
-    else:
-        # Unknown schema - no validation
-        return []
+        tuple: Required field paths, each a tuple of keys for nested access;
+        empty for unknown schemas, which are not validated
+    """
+    return _REQUIRED_FIELDS.get(schema, ())
 
 
 def _has_nested_field(data, field_path):
@@ -229,15 +257,14 @@ def _has_nested_field(data, field_path):
 
     Args:
         data (dict): Data dictionary
-        field_path (str): Field path with dots (e.g., "summary.total_services")
+        field_path (tuple): Pre-split field path (e.g., ("summary", "total_services"))
 
     Returns:
         bool: True if field exists, False otherwise
     """
-    parts = field_path.split('.')
     current = data
 
-    for part in parts:
+    for part in field_path:
         if not isinstance(current, dict) or part not in current:
             return False
         current = current[part]
@@ -15,8 +15,8 @@ short_description: Post events to Matrix rooms
 version_added: "0.1.0"
 description:
     - Posts events to Matrix rooms using the Client-Server API.
-    - This module is a transport layer; you are responsible for building the
-      entire event content dictionary.
+    - This module is a transport layer; either pass the entire event content
+      dictionary, or pass SOLTI event data and let the module build the content.
     - Supports both room IDs (!xxx:server.com) and room aliases (#xxx:server.com).
 options:
     homeserver_url:
@@ -33,9 +33,40 @@ options:
         required: true
         type: str
     content:
-        description: The full `content` dictionary for the Matrix event.
-        required: true
+        description:
+            - The full `content` dictionary for the Matrix event.
+            - Mutually exclusive with I(event_data) and I(event_content).
+        required: false
+        type: dict
+    event_data:
+        description:
+            - SOLTI event data. Its C(schema) key selects the generated human-readable
+              body and an optional C(source) key describes where the event came from;
+              the remaining keys are the schema-specific data.
+            - Posted as an C(m.text) message carrying the SOLTI envelope
+              (C(schema), C(timestamp), C(source), C(data)) under the C(solti) key.
+            - Mutually exclusive with I(content) and I(event_content).
+        required: false
         type: dict
+    event_type:
+        description: Matrix event type to post.
+        type: str
+        default: m.room.message
+    event_content:
+        description:
+            - Content dictionary for a custom I(event_type).
+            - Mutually exclusive with I(content) and I(event_data).
+        required: false
+        type: dict
+    events:
+        description:
+            - List of full event content dictionaries to post, in order, as
+              separate events of type I(event_type).
+            - All events reuse one client and connection; posting stops at the first failure.
+            - Mutually exclusive with I(content), I(event_data), I(event_content) and I(transaction_id).
+        required: false
+        type: list
+        elements: dict
     state:
         description: Whether to post the event.
         type: str
@@ -51,7 +82,8 @@ options:
         default: true
 notes:
     - This module does no validation or modification of the `content` dict.
-    - You must construct the entire event content, including `msgtype` and `body`.
+    - With I(content) you must construct the entire event content, including `msgtype` and `body`.
+    - Exactly one of I(content), I(event_data), I(event_content) or I(events) is required.
 author:
     - SOLTI Contributors
 '''
@@ -96,14 +128,54 @@ EXAMPLES = r'''
     content:
       msgtype: "m.text"
       body: "Deployment started on host {{ ansible_hostname }} by {{ ansible_user_id }}"
+
+# Let the module build the body from SOLTI event data
+- name: Post deployment start event
+  jackaltx.solti_matrix_mgr.matrix_event:
+    homeserver_url: "https://matrix.example.com"
+    access_token: "{{ bot_token }}"
+    room_id: "#solti-ops:example.com"
+    event_data:
+      schema: "deploy.start.v1"
+      source: "mylab/{{ inventory_hostname }}"
+      service: "loki"
+      host: "{{ ansible_hostname }}"
+
+# Several messages in one task
+- name: Post batch of messages
+  jackaltx.solti_matrix_mgr.matrix_event:
+    homeserver_url: "https://matrix.example.com"
+    access_token: "{{ bot_token }}"
+    room_id: "#solti-ops:example.com"
+    events:
+      - msgtype: "m.text"
+        body: "Stage 1 complete"
+      - msgtype: "m.text"
+        body: "Stage 2 complete"
+
+# Custom event type
+- name: Post custom event
+  jackaltx.solti_matrix_mgr.matrix_event:
+    homeserver_url: "https://matrix.example.com"
+    access_token: "{{ bot_token }}"
+    room_id: "#solti-ops:example.com"
+    event_type: "com.solti.verify.fail"
+    event_content:
+      hostname: "{{ ansible_hostname }}"
 '''
 
 RETURN = r'''
 event_id:
     description: Matrix event ID of the posted event
-    returned: success
+    returned: success, when not using I(events)
     type: str
     sample: "$abc123def456:example.com"
+event_ids:
+    description: Matrix event IDs of the posted events, in order
+    returned: when using I(events)
+    type: list
+    elements: str
+    sample: ["$abc123def456:example.com", "$def789abc012:example.com"]
 room_id:
     description: Room ID where event was posted
     returned: success
@@ -130,12 +202,16 @@ try:
         resolve_room_identifier
     )
     from ansible_collections.jackaltx.solti_matrix_mgr.plugins.module_utils.solti_event import (
+        create_solti_event,
         _generate_body
     )
 except ImportError:
     # Fallback for local development
     from ansible.module_utils.matrix_client import MatrixClientAPI, resolve_room_identifier
-    from ansible.module_utils.solti_event import _generate_body
+    from ansible.module_utils.solti_event import create_solti_event, _generate_body
+
+# Default event type: plain room messages show up in every client
+_EVENT_TYPE = "m.room.message"
 
 
 def main():
@@ -147,11 +223,20 @@ def main():
             user_id=dict(type='str', required=False),
             password=dict(type='str', required=False, no_log=True),
             room_id=dict(type='str', required=True),
-            content=dict(type='dict', required=True),
+            content=dict(type='dict', required=False),
+            event_data=dict(type='dict', required=False),
+            event_type=dict(type='str', default=_EVENT_TYPE),
+            event_content=dict(type='dict', required=False),
+            events=dict(type='list', elements='dict', required=False),
             state=dict(type='str', default='present', choices=['present', 'absent']),
             transaction_id=dict(type='str', required=False),
             validate_certs=dict(type='bool', default=True),
         ),
+        mutually_exclusive=[
+            ('content', 'event_data', 'event_content', 'events'),
+            ('events', 'transaction_id'),
+        ],
+        required_one_of=[('content', 'event_data', 'event_content', 'events')],
         supports_check_mode=True,
     )
 
@@ -160,6 +245,9 @@ def main():
     access_token = module.params['access_token']
     room_id = module.params['room_id']
     content = module.params['content']
+    event_data = module.params['event_data']
+    event_type = module.params['event_type']
+    events = module.params['events']
     state = module.params['state']
     transaction_id = module.params.get('transaction_id')
     validate_certs = module.params['validate_certs']
@@ -196,8 +284,54 @@ def main():
             room_id=room_id
         )
 
-    # Post event to Matrix (always use m.room.message for visibility)
-    event_type = "m.room.message"
+    # Batch mode: post each content dict in order through the same client
+    if events is not None:
+        event_ids = []
+        for event_content in events:
+            try:
+                result = api.send_event(
+                    room_id=resolved_room_id,
+                    event_type=event_type,
+                    content=event_content
+                )
+            except Exception as e:
+                module.fail_json(
+                    msg=f"Exception posting event {len(event_ids) + 1} of {len(events)}: {str(e)}",
+                    changed=bool(event_ids),
+                    event_ids=event_ids
+                )
+            if result['status_code'] != 200:
+                module.fail_json(
+                    msg=f"Failed to post event {len(event_ids) + 1} of {len(events)}: HTTP {result['status_code']}",
+                    changed=bool(event_ids),
+                    event_ids=event_ids,
+                    status_code=result['status_code'],
+                    body=result['body'],
+                    url=result['url']
+                )
+            event_ids.append(result['body'].get('event_id'))
+
+        module.exit_json(
+            changed=bool(event_ids),
+            event_ids=event_ids,
+            room_id=resolved_room_id,
+            event_type=event_type,
+            access_token=api.access_token,
+            reauthenticated=api.reauthenticated,
+            msg=f"Posted {len(event_ids)} events"
+        )
+
+    # Build the event content from whichever form was given
+    if event_data is not None:
+        data = dict(event_data)
+        schema = data.pop('schema', 'unknown')
+        source = data.pop('source', None)
+        content = create_solti_event(schema, data, source)
+        # Plain text with a generated summary renders in every client
+        content['msgtype'] = "m.text"
+        content['body'] = _generate_body(schema, data)
+    elif content is None:
+        content = module.params['event_content']
 
     try:
         result = api.send_event(
@@ -212,7 +346,7 @@ def main():
                 changed=True,
                 event_id=result['body'].get('event_id'),
                 room_id=resolved_room_id,
-                transaction_id=transaction_id or api._generate_transaction_id(resolved_room_id, event_type),
+                transaction_id=result['transaction_id'],
                 event_type=event_type,
                 access_token=api.access_token,
                 reauthenticated=api.reauthenticated,
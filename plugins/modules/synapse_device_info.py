@@ -45,6 +45,20 @@ options:
         description: Revoke (delete) devices that match the filters
         type: bool
         default: false
+    max_revocations:
+        description:
+            - With I(revoke_matched), stop matching after this many devices so at most
+              this many are revoked per run (e.g. to stay under rate limits).
+              Must be 0 or greater.
+            - C(matched_devices) and C(matched_count) then reflect the capped set.
+        type: int
+    count_only:
+        description:
+            - Only count devices; C(devices) and C(matched_devices) are returned
+              empty, while C(total_devices) and C(matched_count) are still set.
+            - Ignored when I(revoke_matched) is true.
+        type: bool
+        default: false
     validate_certs:
         description: Validate SSL certificates
         type: bool
@@ -91,7 +105,7 @@ EXAMPLES = r'''
 
 RETURN = r'''
 devices:
-    description: All devices for the user
+    description: All devices for the user (empty with count_only)
     type: list
     returned: always
     sample:
@@ -102,7 +116,7 @@ devices:
           last_seen_user_agent: "Mozilla/5.0..."
           user_id: "@admin:example.com"
 matched_devices:
-    description: Devices that matched the filter criteria
+    description: Devices that matched the filter criteria (empty with count_only)
     type: list
     returned: always
 revoked_devices:
@@ -124,15 +138,27 @@ changed:
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.jackaltx.solti_matrix_mgr.plugins.module_utils.matrix_api import MatrixAdminAPI
+from ansible_collections.jackaltx.solti_matrix_mgr.plugins.module_utils.matrix_api import (
+    MatrixAdminAPI,
+    bulk_apply,
+)
 import time
+from itertools import islice
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
 
 
 def list_user_devices(api, user_id):
     """List all devices for a user."""
-    result = api.get(f"users/{user_id}/devices", api_version="v2")
+    # Parsed incrementally: the raw body is never held alongside the list
+    result = api._request_stream("GET", f"users/{user_id}/devices", 'devices.item', api_version="v2")
     if result['status_code'] == 200:
-        return result['body'].get('devices', [])
+        try:
+            return list(result['items'])
+        except Exception:
+            # ijson and the JSON backends raise different errors for a
+            # malformed body; treat it like a user without devices
+            return []
     elif result['status_code'] == 404:
         return []
     return None
@@ -140,55 +166,63 @@ def list_user_devices(api, user_id):
 
 def delete_device(api, user_id, device_id):
     """Delete/revoke a specific device."""
-    result = api.delete(f"users/{user_id}/devices/{device_id}", api_version="v2")
+    result = api.delete(f"users/{user_id}/devices/{device_id}", api_version="v2", parse_body=False)
     return result['status_code'] == 200
 
 
-def filter_devices(devices, user_agent_filter=None, older_than_days=None, display_name_filter=None):
-    """Filter devices based on criteria."""
-    matched = []
-    current_time_ms = int(time.time() * 1000)
+def bulk_delete_devices(api, user_id, device_ids):
+    """Delete/revoke several devices in one request (all or nothing)."""
+    result = api.post(f"users/{user_id}/delete_devices", data={"devices": device_ids}, api_version="v2", parse_body=False)
+    return result['status_code'] == 200
 
-    for device in devices:
-        # User agent filter
-        if user_agent_filter:
-            user_agent = device.get('last_seen_user_agent') or ''
-            if user_agent_filter.lower() not in user_agent.lower():
-                continue
 
-        # Display name filter
-        if display_name_filter:
-            display_name = device.get('display_name') or ''
-            if display_name_filter.lower() not in display_name.lower():
-                continue
+def filter_devices(devices, user_agent_filter=None, older_than_days=None, display_name_filter=None,
+                   max_matches=None):
+    """Filter devices based on criteria, stopping after max_matches matches if given."""
+    matches = filter_devices_iter(
+        devices,
+        user_agent_filter=user_agent_filter,
+        older_than_days=older_than_days,
+        display_name_filter=display_name_filter,
+    )
+    # The generator is lazy, so the scan itself stops at the cap
+    return list(islice(matches, max_matches))
 
-        # Age filter
-        if older_than_days is not None:
-            last_seen_ts = device.get('last_seen_ts')
 
-            # Handle never-seen devices (last_seen_ts is None)
-            if last_seen_ts is None:
-                # Only match never-seen devices if older_than_days is exactly 0
-                if older_than_days == 0:
-                    matched.append(device)
-                # Skip this device for all other cases
-                continue
+def filter_devices_iter(devices, user_agent_filter=None, older_than_days=None, display_name_filter=None):
+    """Yield the devices matching the criteria, without building a list."""
+    # No filters (plain audit): every device matches
+    if not user_agent_filter and not display_name_filter and older_than_days is None:
+        yield from devices
+        return
 
-            # Calculate age for devices with last_seen_ts
-            age_ms = current_time_ms - last_seen_ts
-            age_days = age_ms / (1000 * 60 * 60 * 24)
+    # Lowercase the needles once rather than per device
+    ua_needle = user_agent_filter.lower() if user_agent_filter else None
+    dn_needle = display_name_filter.lower() if display_name_filter else None
+    if older_than_days is not None:
+        current_time_ms = time.time_ns() // 1_000_000
+        threshold_ms = older_than_days * MS_PER_DAY
 
-            # Skip if device is newer than threshold
-            if age_days < older_than_days:
-                continue
+    for device in devices:
+        # User agent filter
+        if ua_needle and ua_needle not in (device.get('last_seen_user_agent') or '').lower():
+            continue
 
-            # Skip never-seen check (older_than_days=0) if we have a timestamp
-            if older_than_days == 0:
-                continue
+        # Display name filter
+        if dn_needle and dn_needle not in (device.get('display_name') or '').lower():
+            continue
 
-        matched.append(device)
+        # Age filter: 0 selects never-seen devices (no last_seen_ts) only;
+        # otherwise match devices last seen at least older_than_days ago
+        if older_than_days == 0:
+            if device.get('last_seen_ts') is not None:
+                continue
+        elif older_than_days is not None:
+            last_seen_ts = device.get('last_seen_ts')
+            if last_seen_ts is None or current_time_ms - last_seen_ts < threshold_ms:
+                continue
 
-    return matched
+        yield device
 
 
 def run_module():
@@ -202,6 +236,8 @@ def run_module():
         older_than_days=dict(type='int'),
         display_name_filter=dict(type='str'),
         revoke_matched=dict(type='bool', default=False),
+        max_revocations=dict(type='int'),
+        count_only=dict(type='bool', default=False),
         validate_certs=dict(type='bool', default=True),
     )
 
@@ -218,6 +254,9 @@ def run_module():
         supports_check_mode=True
     )
 
+    if module.params['max_revocations'] is not None and module.params['max_revocations'] < 0:
+        module.fail_json(msg=f"max_revocations must be 0 or greater, got {module.params['max_revocations']}")
+
     api = MatrixAdminAPI(
         module,
         module.params['homeserver_url'],
@@ -235,19 +274,30 @@ def run_module():
     if devices is None:
         module.fail_json(msg=f"Failed to query devices for user {user_id}")
 
-    result['devices'] = devices
+    count_only = module.params['count_only'] and not module.params['revoke_matched']
+    if not count_only:
+        result['devices'] = devices
     result['total_devices'] = len(devices)
 
-    # Apply filters
-    matched = filter_devices(
-        devices,
+    filters = dict(
         user_agent_filter=module.params['user_agent_filter'],
         older_than_days=module.params['older_than_days'],
         display_name_filter=module.params['display_name_filter'],
     )
 
-    result['matched_devices'] = matched
-    result['matched_count'] = len(matched)
+    if count_only:
+        # Count-only audit: tally matches without keeping them
+        matched = []
+        result['matched_count'] = sum(1 for device in filter_devices_iter(devices, **filters))
+    else:
+        # Apply filters
+        matched = filter_devices(
+            devices,
+            max_matches=module.params['max_revocations'] if module.params['revoke_matched'] else None,
+            **filters
+        )
+        result['matched_devices'] = matched
+        result['matched_count'] = len(matched)
 
     # Revoke matched devices if requested
     if module.params['revoke_matched'] and matched:
@@ -258,12 +308,19 @@ def run_module():
             revoked = []
             failed = []
 
-            for device in matched:
-                device_id = device['device_id']
-                if delete_device(api, user_id, device_id):
-                    revoked.append(device_id)
-                else:
-                    failed.append(device_id)
+            device_ids = [device['device_id'] for device in matched]
+
+            # One request for the whole batch; per-device deletes only if it fails
+            if len(device_ids) > 1 and bulk_delete_devices(api, user_id, device_ids):
+                revoked = device_ids
+            else:
+                # Deletes are independent; run them concurrently over the session
+                outcomes = bulk_apply(api, [(delete_device, (user_id, device_id), None) for device_id in device_ids])
+                for device_id, deleted in zip(device_ids, outcomes):
+                    if deleted:
+                        revoked.append(device_id)
+                    else:
+                        failed.append(device_id)
 
             result['revoked_devices'] = revoked
             result['changed'] = len(revoked) > 0
@@ -275,6 +332,7 @@ def run_module():
     result['access_token'] = api.access_token
     result['reauthenticated'] = api.reauthenticated
 
+    api.close()
     module.exit_json(**result)
 
 
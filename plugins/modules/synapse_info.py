@@ -109,8 +109,10 @@ registration_tokens:
 '''
 
 from ansible.module_utils.basic import AnsibleModule
+from urllib.parse import urlencode
 from ansible_collections.jackaltx.solti_matrix_mgr.plugins.module_utils.matrix_api import (
     MatrixAdminAPI,
+    bulk_apply,
     get_server_version,
     list_rooms,
     list_registration_tokens,
@@ -119,10 +121,10 @@ from ansible_collections.jackaltx.solti_matrix_mgr.plugins.module_utils.matrix_a
 
 def list_users(api, limit=100, name_filter=None):
     """List users with optional filter."""
-    endpoint = f"users?limit={limit}"
+    params = {'limit': limit}
     if name_filter:
-        endpoint += f"&name={name_filter}"
-    return api.get(endpoint, api_version="v2")
+        params['name'] = name_filter
+    return api.get("users?" + urlencode(params), api_version="v2")
 
 
 def run_module():
@@ -161,37 +163,50 @@ def run_module():
         password=module.params.get('admin_password'),
     )
 
-    gather = module.params['gather']
+    gather = set(module.params['gather'])
     if 'all' in gather:
-        gather = ['version', 'users', 'rooms', 'registration_tokens']
+        gather = {'version', 'users', 'rooms', 'registration_tokens'}
 
     limit = module.params['limit']
 
-    if 'version' in gather:
-        resp = get_server_version(api)
+    # The queries are independent and read-only: issue them concurrently
+    queries = [
+        ('version', (get_server_version, (), None)),
+        ('users', (list_users, (), dict(limit=limit, name_filter=module.params['users_filter']))),
+        ('rooms', (list_rooms, (), dict(limit=limit, search_term=module.params['rooms_filter']))),
+        ('registration_tokens', (list_registration_tokens, (), None)),
+    ]
+    queries = [(key, operation) for key, operation in queries if key in gather]
+    responses = dict(zip(
+        [key for key, operation in queries],
+        bulk_apply(api, [operation for key, operation in queries]),
+    ))
+
+    if 'version' in responses:
+        resp = responses['version']
         if resp['status_code'] == 200:
             result['version'] = resp['body']
         else:
             module.warn(f"Failed to get version: {resp['body']}")
 
-    if 'users' in gather:
-        resp = list_users(api, limit=limit, name_filter=module.params['users_filter'])
+    if 'users' in responses:
+        resp = responses['users']
         if resp['status_code'] == 200:
             result['users'] = resp['body'].get('users', [])
             result['users_total'] = resp['body'].get('total', len(result['users']))
         else:
             module.warn(f"Failed to list users: {resp['body']}")
 
-    if 'rooms' in gather:
-        resp = list_rooms(api, limit=limit, search_term=module.params['rooms_filter'])
+    if 'rooms' in responses:
+        resp = responses['rooms']
         if resp['status_code'] == 200:
             result['rooms'] = resp['body'].get('rooms', [])
             result['rooms_total'] = resp['body'].get('total_rooms', len(result['rooms']))
         else:
             module.warn(f"Failed to list rooms: {resp['body']}")
 
-    if 'registration_tokens' in gather:
-        resp = list_registration_tokens(api)
+    if 'registration_tokens' in responses:
+        resp = responses['registration_tokens']
         if resp['status_code'] == 200:
             result['registration_tokens'] = resp['body'].get('registration_tokens', [])
         else:
@@ -201,6 +216,7 @@ def run_module():
     result['access_token'] = api.access_token
     result['reauthenticated'] = api.reauthenticated
 
+    api.close()
     module.exit_json(**result)
 
 
@@ -29,9 +29,35 @@ options:
         type: str
         no_log: true
     room_id:
-        description: Room ID (!room:server.com) or alias (#room:server.com)
-        required: true
+        description: >-
+            Room ID (!room:server.com) or alias (#room:server.com).
+            Required unless rooms is given.
         type: str
+    rooms:
+        description: >-
+            Bulk mode. List of rooms to process concurrently instead of a
+            single room_id. Each entry needs a room_id and may override
+            purge, block, message and new_room_user_id for that room.
+            Only supported with state=absent.
+        type: list
+        elements: dict
+        suboptions:
+            room_id:
+                description: Room ID (!room:server.com) or alias (#room:server.com)
+                type: str
+                required: true
+            purge:
+                description: Overrides purge for this room
+                type: bool
+            block:
+                description: Overrides block for this room
+                type: bool
+            message:
+                description: Overrides message for this room
+                type: str
+            new_room_user_id:
+                description: Overrides new_room_user_id for this room
+                type: str
     state:
         description: Desired state of the room
         type: str
@@ -84,6 +110,12 @@ options:
         type: list
         elements: str
         default: []
+    creator_user_id:
+        description: >-
+            User ID of the access_token owner, used to leave the creator out
+            of the invite list (used with state=present). When omitted it
+            is looked up with a whoami call if anyone is to be invited.
+        type: str
     power_level_content_override:
         description: >-
             Raw power_level_content_override dict passed directly to the
@@ -105,12 +137,29 @@ options:
     message:
         description: Message to send before deleting room
         type: str
+    reason:
+        description: Reason for joining, shown to other room members (used with state=join)
+        type: str
+    lookup_cache:
+        description: >-
+            Share alias and whoami lookups between runs (e.g. a loop over
+            rooms) through a file in the user's cache directory
+            (C($XDG_CACHE_HOME/solti_matrix_mgr), default C(~/.cache/solti_matrix_mgr))
+            on the managed host, for up to 5 minutes. Only state=info and
+            members trust a cached alias; states that change a room always
+            look the alias up again. Disabled by default, in which case no
+            file is read or written.
+        type: bool
+        default: false
     validate_certs:
         description: Validate SSL certificates
         type: bool
         default: true
 author:
     - SOLTI Contributors
+notes:
+    - In check mode, state=present, absent and join report C(changed) without
+      contacting the homeserver, so the room is not looked up.
 '''
 
 EXAMPLES = r'''
@@ -152,6 +201,16 @@ EXAMPLES = r'''
     state: info
   register: room_info
 
+- name: Delete several rooms in one task
+  jackaltx.solti_matrix_mgr.synapse_room:
+    homeserver_url: "https://matrix.example.com"
+    access_token: "{{ admin_token }}"
+    state: absent
+    rooms:
+      - room_id: "!oldroom1:example.com"
+      - room_id: "#old-alias:example.com"
+        block: true
+
 - name: Delete and purge a room
   jackaltx.solti_matrix_mgr.synapse_room:
     homeserver_url: "https://matrix.example.com"
@@ -177,129 +236,321 @@ delete_id:
     description: Deletion task ID (for async tracking)
     type: str
     returned: when state=absent
+rooms_results:
+    description: >-
+        Per-room outcome in bulk mode, in the order of rooms. Each entry has
+        room_id, changed and, where applicable, delete_id or msg.
+    type: list
+    elements: dict
+    returned: when rooms is given
 '''
 
+import hashlib
 import json
+import os
+import tempfile
+import threading
+import time
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.urls import fetch_url
 from ansible_collections.jackaltx.solti_matrix_mgr.plugins.module_utils.matrix_api import (
     MatrixAdminAPI,
+    _quote_id,
+    bulk_apply,
     get_room_info,
     get_room_members,
     delete_room,
 )
 
+# With lookup_cache=true, alias and whoami lookups are shared between module
+# runs (e.g. a loop over rooms) through this file in the user's cache
+# directory, keyed by homeserver, token hash and lookup name
+LOOKUP_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'solti_matrix_mgr')
+LOOKUP_CACHE_PATH = os.path.join(LOOKUP_CACHE_DIR, 'synapse_room_lookups.json')
+LOOKUP_CACHE_TTL = 300
+WHOAMI_CACHE_NAME = "__whoami__"
 
-def resolve_room_alias(module, homeserver_url, access_token, alias):
-    """Resolve a room alias to room ID using Client-Server API."""
-    try:
-        from urllib.parse import quote as url_quote
-    except ImportError:
-        from urllib import quote as url_quote
+# Serializes cache file updates from concurrent lookups in this process
+_LOOKUP_CACHE_LOCK = threading.Lock()
 
-    # URL-encode the full alias (#room:server.com → %23room%3Aserver.com)
-    alias_encoded = url_quote(alias, safe='')
-    url = f"{homeserver_url}/_matrix/client/v3/directory/room/{alias_encoded}"
 
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-    }
+def _lookup_cache_key(api, name):
+    token_hash = hashlib.sha256((api.access_token or '').encode()).hexdigest()[:16]
+    return f"{api.homeserver_url}|{token_hash}|{name}"
 
-    response, info = fetch_url(module, url, method="GET", headers=headers)
-
-    if info.get('status') == 200 and response:
-        try:
-            body = json.loads(response.read())
-            return body.get('room_id')
-        except (ValueError, AttributeError):
-            pass
-    return None
 
+def _load_lookup_cache():
+    """Read the on-disk lookup cache; a missing or corrupt file is an empty cache."""
+    try:
+        with open(LOOKUP_CACHE_PATH, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _save_lookup_cache(module, cache):
+    """Atomically replace the on-disk lookup cache (mode 0600), dropping stale entries."""
+    now = time.time()
+    cache = {
+        key: entry for key, entry in cache.items()
+        if isinstance(entry, list) and len(entry) == 2 and now - entry[1] < LOOKUP_CACHE_TTL
+    }
+    try:
+        os.makedirs(LOOKUP_CACHE_DIR, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.synapse_room_lookups.', dir=LOOKUP_CACHE_DIR)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, LOOKUP_CACHE_PATH)
+    except OSError as e:
+        module.warn(f"Failed to write lookup cache {LOOKUP_CACHE_PATH}: {str(e)}")
+
+
+def cached_lookup(api, name, lookup, revalidate=False):
+    """
+    Return lookup() through the cross-run cache (when lookup_cache is set).
+
+    Only successful (truthy) results are cached, so a missing alias is
+    looked up again on the next run. With revalidate=True the cached value
+    is ignored and replaced by a fresh lookup.
+    """
+    if not api.module.params['lookup_cache']:
+        return lookup()
+
+    key = _lookup_cache_key(api, name)
+    if not revalidate:
+        cache = _load_lookup_cache()
+        entry = cache.get(key)
+        if isinstance(entry, list) and len(entry) == 2 and time.time() - entry[1] < LOOKUP_CACHE_TTL:
+            return entry[0]
+
+    value = lookup()
+    if value:
+        with _LOOKUP_CACHE_LOCK:
+            # Re-read so entries written by concurrent lookups are kept
+            cache = _load_lookup_cache()
+            cache[key] = [value, time.time()]
+            _save_lookup_cache(api.module, cache)
+    return value
+
+
+def forget_lookup(api, name):
+    """Drop a cached lookup, e.g. the alias of a room that was just deleted."""
+    if not api.module.params['lookup_cache']:
+        return
+
+    key = _lookup_cache_key(api, name)
+    with _LOOKUP_CACHE_LOCK:
+        cache = _load_lookup_cache()
+        if cache.pop(key, None) is not None:
+            _save_lookup_cache(api.module, cache)
+
+
+def resolve_room_alias(api, alias):
+    """
+    Resolve a room alias to room ID using Client-Server API.
+
+    Only the top-level room_id is pulled from the response (incrementally
+    with ijson when available); the servers list is never decoded.
+    """
+    # URL-encode the full alias (#room:server.com → %23room%3Aserver.com)
+    resp = api._request_stream("GET", f"directory/room/{_quote_id(alias)}", 'room_id', api_version="client")
+    if resp['status_code'] != 200:
+        return None
 
-def get_whoami(module, homeserver_url, access_token):
+    items = resp['items']
+    try:
+        room_id = next(items, None)
+    except Exception:
+        # ijson and the JSON backends raise different errors for a malformed body
+        room_id = None
+    finally:
+        # Stop parsing and hand the connection back to the pool
+        close = getattr(items, 'close', None)
+        if close:
+            close()
+    return room_id if isinstance(room_id, str) else None
+
+
+def get_whoami(api):
     """Get the authenticated user's ID via Client-Server API."""
-    url = f"{homeserver_url}/_matrix/client/v3/account/whoami"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response, info = fetch_url(module, url, method="GET", headers=headers)
-    if info.get('status') == 200 and response:
-        try:
-            body = json.loads(response.read())
-            return body.get('user_id')
-        except (ValueError, AttributeError):
-            pass
+    resp = api._request("GET", "account/whoami", api_version="client")
+    if resp['status_code'] == 200 and isinstance(resp['body'], dict):
+        return resp['body'].get('user_id')
     return None
 
 
-def create_room(module, homeserver_url, access_token, data):
+def create_room(api, data):
     """Create a room using the Client-Server API."""
-    url = f"{homeserver_url}/_matrix/client/v3/createRoom"
+    resp = api._request("POST", "createRoom", data=data, api_version="client")
 
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-    }
+    # Include a hint when the request never reached the server
+    if not resp['body'] and resp['status_code'] < 0:
+        resp['body'] = {'error': 'Request failed', 'url': resp['url']}
+
+    return resp
 
-    response, info = fetch_url(
-        module, url, method="POST",
-        headers=headers, data=json.dumps(data),
-    )
 
-    status_code = info.get('status', -1)
-    body = {}
+# What classify_room() found out about a room
+ROOM_EXISTS = 'exists'
+ROOM_NOT_FOUND = 'not_found'
+ROOM_ACCESS_DENIED = 'access_denied'
+ROOM_ALIAS_ONLY = 'alias_only'
 
-    if response:
-        try:
-            body = json.loads(response.read())
-        except (ValueError, AttributeError):
-            pass
 
-    if not body and 'body' in info:
-        try:
-            body = json.loads(info['body'])
-        except (ValueError, TypeError):
-            body = {'raw': info.get('body', '')}
+def classify_room(api, room_id, alias_resolved):
+    """
+    Look up a room once and classify it.
 
-    # Include status and any error message from fetch_url
-    if not body and status_code < 0:
-        body = {'error': info.get('msg', 'Unknown error'), 'url': url}
+    If the alias resolved, the room definitely exists: the Admin API is
+    tried for details, but a token without admin privileges doesn't make
+    it count as missing.
 
-    return {'status_code': status_code, 'body': body, 'url': url}
+    Returns:
+        tuple: (room_state, room) - room is the room details for
+        ROOM_EXISTS, the error dict for ROOM_ACCESS_DENIED, otherwise None
+    """
+    if room_id.startswith('#'):
+        # Alias that did not resolve
+        return ROOM_ALIAS_ONLY, None
 
+    room = get_room_info(api, room_id)
+    if room and 'error' not in room:
+        return ROOM_EXISTS, room
+    if alias_resolved:
+        return ROOM_EXISTS, {'room_id': room_id, 'resolved_from_alias': True}
+    if room is None:
+        return ROOM_NOT_FOUND, None
+    return ROOM_ACCESS_DENIED, room
 
-def run_module():
-    module_args = dict(
-        homeserver_url=dict(type='str', required=True),
-        access_token=dict(type='str', required=True, no_log=True),
-        admin_user=dict(type='str', required=False),
-        admin_password=dict(type='str', required=False, no_log=True),
+
+# Per-room overrides accepted in bulk mode
+BULK_ROOM_OPTIONS = ('purge', 'block', 'message', 'new_room_user_id')
+
+
+def build_delete_data(options):
+    """Build the v2 room deletion body from purge/block/message/new_room_user_id."""
+    data = {
+        "purge": options['purge'],
+        "block": options['block'],
+    }
+    if options.get('new_room_user_id'):
+        data['new_room_user_id'] = options['new_room_user_id']
+    if options.get('message'):
+        data['message'] = options['message']
+    return data
+
+
+def delete_one_room(api, room_id, options, check_mode=False):
+    """
+    Delete a single room for bulk mode.
+
+    A room (or alias) that no longer exists is reported unchanged rather
+    than failed. Returns a dict with room_id, changed and either delete_id
+    or failed/msg.
+    """
+    outcome = {'room_id': room_id, 'changed': False}
+    if room_id.startswith('#'):
+        # Never delete through a cached alias: it may have moved since
+        resolved = cached_lookup(api, room_id, lambda: resolve_room_alias(api, room_id), revalidate=True)
+        if not resolved:
+            return outcome
+        target = resolved
+    else:
+        # The v2 delete accepts any well-formed room ID, so check first
+        if classify_room(api, room_id, False)[0] != ROOM_EXISTS:
+            return outcome
+        target = room_id
+
+    if check_mode:
+        outcome['changed'] = True
+        return outcome
+
+    resp = api.delete(f"rooms/{target}", data=build_delete_data(options), api_version="v2")
+    if resp['status_code'] == 200:
+        outcome['changed'] = True
+        outcome['delete_id'] = resp['body'].get('delete_id')
+        if target != room_id:
+            forget_lookup(api, room_id)
+    elif resp['status_code'] != 404:
+        outcome['failed'] = True
+        outcome['msg'] = f"Failed to delete room: {resp['body']}"
+    return outcome
+
+
+def run_bulk(module, api, result):
+    """Process module.params['rooms'] concurrently and exit the module."""
+    if module.params['state'] != 'absent':
+        module.fail_json(msg="rooms is only supported with state=absent")
+
+    defaults = {option: module.params[option] for option in BULK_ROOM_OPTIONS}
+    operations = []
+    for room in module.params['rooms']:
+        options = dict(defaults)
+        options.update((option, room[option]) for option in BULK_ROOM_OPTIONS if room[option] is not None)
+        operations.append((delete_one_room, (room['room_id'], options), {'check_mode': module.check_mode}))
+
+    outcomes = bulk_apply(api, operations)
+    result['rooms_results'] = outcomes
+    result['changed'] = any(outcome['changed'] for outcome in outcomes)
+    result['access_token'] = api.access_token
+    result['reauthenticated'] = api.reauthenticated
+
+    failed = [outcome for outcome in outcomes if outcome.get('failed')]
+    if failed:
+        module.fail_json(msg=f"Failed to delete {len(failed)} of {len(outcomes)} rooms", **result)
+    api.close()
+    module.exit_json(**result)
+
+
+# Built once at import rather than on every run_module() call
+_MODULE_ARGS = dict(
+    homeserver_url=dict(type='str', required=True),
+    access_token=dict(type='str', required=True, no_log=True),
+    admin_user=dict(type='str', required=False),
+    admin_password=dict(type='str', required=False, no_log=True),
+    room_id=dict(type='str'),
+    rooms=dict(type='list', elements='dict', options=dict(
         room_id=dict(type='str', required=True),
-        state=dict(type='str', default='info', choices=['present', 'absent', 'info', 'members', 'join']),
-        user_id=dict(type='str'),
-        purge=dict(type='bool', default=True),
-        block=dict(type='bool', default=False),
-        room_name=dict(type='str'),
-        room_alias_name=dict(type='str'),
-        topic=dict(type='str'),
-        invite=dict(type='list', elements='str', default=[]),
-        admins=dict(type='list', elements='str', default=[]),
-        moderators=dict(type='list', elements='str', default=[]),
-        power_level_content_override=dict(type='dict'),
-        preset=dict(type='str', default='private_chat',
-                    choices=['private_chat', 'public_chat', 'trusted_private_chat']),
-        guest_access=dict(type='str', default='forbidden',
-                          choices=['can_join', 'forbidden']),
-        new_room_user_id=dict(type='str'),
+        purge=dict(type='bool'),
+        block=dict(type='bool'),
         message=dict(type='str'),
-        validate_certs=dict(type='bool', default=True),
-    )
+        new_room_user_id=dict(type='str'),
+    )),
+    state=dict(type='str', default='info', choices=['present', 'absent', 'info', 'members', 'join']),
+    user_id=dict(type='str'),
+    purge=dict(type='bool', default=True),
+    block=dict(type='bool', default=False),
+    room_name=dict(type='str'),
+    room_alias_name=dict(type='str'),
+    topic=dict(type='str'),
+    invite=dict(type='list', elements='str', default=[]),
+    admins=dict(type='list', elements='str', default=[]),
+    moderators=dict(type='list', elements='str', default=[]),
+    power_level_content_override=dict(type='dict'),
+    preset=dict(type='str', default='private_chat',
+                choices=['private_chat', 'public_chat', 'trusted_private_chat']),
+    guest_access=dict(type='str', default='forbidden',
+                      choices=['can_join', 'forbidden']),
+    new_room_user_id=dict(type='str'),
+    creator_user_id=dict(type='str'),
+    message=dict(type='str'),
+    reason=dict(type='str'),
+    lookup_cache=dict(type='bool', default=False),
+    validate_certs=dict(type='bool', default=True),
+)
 
+
+def run_module():
     result = dict(
         changed=False,
         room={},
     )
 
     module = AnsibleModule(
-        argument_spec=module_args,
+        argument_spec=_MODULE_ARGS,
+        mutually_exclusive=[('room_id', 'rooms')],
+        required_one_of=[('room_id', 'rooms')],
         supports_check_mode=True
     )
 
@@ -312,42 +563,71 @@ def run_module():
         password=module.params.get('admin_password'),
     )
 
+    if module.params['rooms'] is not None:
+        run_bulk(module, api, result)
+
     room_id = module.params['room_id']
     state = module.params['state']
 
+    # Dry runs of the changing states report a change without any network
+    # calls, even though the room may turn out to be in the desired state
+    if module.check_mode and state in ('present', 'absent', 'join'):
+        result['changed'] = True
+        result['access_token'] = api.access_token
+        result['reauthenticated'] = api.reauthenticated
+        module.exit_json(**result)
+
+    # join accepts an alias directly. createRoom reports an alias that is
+    # already taken (M_ROOM_IN_USE), which only proves the room exists when
+    # room_id is that same alias; otherwise present looks the room up first.
+    alias_name = module.params['room_alias_name']
+    skip_lookup = state == 'join' or bool(
+        state == 'present' and alias_name and room_id.startswith('#')
+        and room_id[1:].partition(':')[0] == alias_name)
+
     # Resolve alias if provided
     original_room_id = room_id
     alias_resolved = False
-    if room_id.startswith('#'):
-        resolved = resolve_room_alias(
-            module,
-            module.params['homeserver_url'],
-            module.params['access_token'],
-            room_id,
-        )
+    creator = module.params['creator_user_id']
+    if room_id.startswith('#') and not skip_lookup:
+        # An alias can move to another room (e.g. on a room upgrade), so only
+        # the read-only states trust a cached resolution
+        revalidate = state not in ('info', 'members')
+        if (state == 'present' and not creator
+                and (module.params['invite'] or module.params['admins'] or module.params['moderators'])):
+            # A room created here will need the creator's ID for the invite
+            # list: look it up alongside the alias rather than after it
+            resolved, creator = bulk_apply(api, [
+                (cached_lookup, (room_id, lambda: resolve_room_alias(api, room_id)), {'revalidate': revalidate}),
+                (cached_lookup, (WHOAMI_CACHE_NAME, lambda: get_whoami(api)), None),
+            ])
+        else:
+            resolved = cached_lookup(api, room_id, lambda: resolve_room_alias(api, room_id), revalidate=revalidate)
         if resolved:
             room_id = resolved
             alias_resolved = True
         elif state not in ('present', 'absent', 'join'):
             module.fail_json(msg=f"Could not resolve room alias: {room_id}")
 
-    # Get current room state
-    # If alias resolved, the room definitely exists. Try Admin API for details,
-    # but don't fail if the token lacks admin privileges.
-    current_room = None
-    if not room_id.startswith('#'):
-        current_room = get_room_info(api, room_id)
-        # If Admin API failed but alias resolved, room still exists
-        if (current_room is None or (isinstance(current_room, dict) and 'error' in current_room)) and alias_resolved:
-            current_room = {'room_id': room_id, 'resolved_from_alias': True}
+    # Room details are needed to report them (info) or to decide whether to
+    # create (present) or delete (absent) the room. A resolved alias already
+    # proves the room exists, so absent then skips the second lookup;
+    # members queries its own endpoint.
+    need_details = state in ('info', 'present') or (state == 'absent' and not alias_resolved)
+
+    # Get current room state. Rooms that aren't looked up count as not
+    # found (present then relies on createRoom's M_ROOM_IN_USE).
+    room_state, current_room = ROOM_NOT_FOUND, None
+    if need_details and not skip_lookup:
+        room_state, current_room = classify_room(api, room_id, alias_resolved)
 
     if state == 'info':
-        if current_room and 'error' not in current_room:
+        if room_state == ROOM_EXISTS:
             result['room'] = current_room
-        elif current_room is None:
-            module.fail_json(msg=f"Room not found: {room_id}")
-        else:
+        elif room_state == ROOM_ACCESS_DENIED:
             module.fail_json(msg=f"Failed to query room: {current_room}")
+        else:
+            module.fail_json(msg=f"Room not found: {room_id}")
 
     elif state == 'members':
         members = get_room_members(api, room_id)
@@ -359,135 +639,126 @@ def run_module():
             module.fail_json(msg=f"Failed to query room members: {members}")
 
     elif state == 'absent':
-        if current_room and 'error' not in current_room:
-            if module.check_mode:
+        # The v2 delete is asynchronous and answers 200 for any well-formed
+        # room ID, so only a room known to exist is deleted
+        if alias_resolved or room_state == ROOM_EXISTS:
+            # Use v2 API for async deletion
+            resp = api.delete(f"rooms/{room_id}", data=build_delete_data(module.params), api_version="v2")
+
+            if resp['status_code'] == 200:
                 result['changed'] = True
+                result['delete_id'] = resp['body'].get('delete_id')
+                if alias_resolved:
+                    forget_lookup(api, original_room_id)
+            elif resp['status_code'] == 404:
+                # Room doesn't exist, nothing to do
+                pass
             else:
-                # Build deletion request
-                data = {
-                    "purge": module.params['purge'],
-                    "block": module.params['block'],
-                }
-                if module.params['new_room_user_id']:
-                    data['new_room_user_id'] = module.params['new_room_user_id']
-                if module.params['message']:
-                    data['message'] = module.params['message']
-
-                # Use v2 API for async deletion
-                resp = api.delete(f"rooms/{room_id}", data=data, api_version="v2")
-
-                if resp['status_code'] == 200:
-                    result['changed'] = True
-                    result['delete_id'] = resp['body'].get('delete_id')
-                else:
-                    module.fail_json(msg=f"Failed to delete room: {resp['body']}")
-        else:
-            # Room doesn't exist, nothing to do
-            pass
+                module.fail_json(msg=f"Failed to delete room: {resp['body']}")
 
     elif state == 'join':
         # Join room using the Client-Server API.
         # The access_token owner is the user who joins.
         # For invite-only rooms, the user must have a pending invite first
         # (use invite param in state=present, or invite separately).
-        if module.check_mode:
+        #
+        # Use api._request to hit Client-Server API with self-healing
+        # We must use CLIENT_API_BASE instead of SYNAPSE_API_BASE.
+        # /join/{roomIdOrAlias} resolves aliases server-side.
+        data = {}
+        if module.params['reason']:
+            data['reason'] = module.params['reason']
+        endpoint = f"join/{_quote_id(original_room_id)}"
+        resp = api._request("POST", endpoint, data=data, api_version="client")
+
+        if resp['status_code'] == 200:
             result['changed'] = True
+            result['room'] = resp['body']
         else:
-            # Use api._request to hit Client-Server API with self-healing
-            # We must use CLIENT_API_BASE instead of SYNAPSE_API_BASE
-            endpoint = f"rooms/{room_id}/join"
-            resp = api._request("POST", endpoint, data={}, api_version="client")
-
-            if resp['status_code'] == 200:
-                result['changed'] = True
-                result['room'] = resp['body']
-            else:
-                module.fail_json(msg=f"Failed to join room: {resp['body']}")
+            module.fail_json(msg=f"Failed to join room: {resp['body']}")
 
     elif state == 'present':
-        if current_room and 'error' not in current_room:
+        if room_state == ROOM_EXISTS:
             # Room already exists
             result['room'] = current_room
         else:
-            if module.check_mode:
+            preset = module.params['preset']
+            data = {
+                "visibility": "private" if preset != "public_chat" else "public",
+                "preset": preset,
+            }
+            if module.params['room_name']:
+                data['name'] = module.params['room_name']
+            if alias_name:
+                data['room_alias_name'] = alias_name
+            if module.params['topic']:
+                data['topic'] = module.params['topic']
+
+            # Build invite list: explicit + admins + moderators (deduplicated)
+            # Exclude the creator — they're already in the room
+            admins = module.params['admins'] or []
+            moderators = module.params['moderators'] or []
+            invite_set = set(module.params['invite'] or []).union(admins, moderators)
+
+            # Determine the creating user (unless given or already looked
+            # up); only needed when there is someone to invite
+            if not creator and invite_set:
+                creator = cached_lookup(api, WHOAMI_CACHE_NAME, lambda: get_whoami(api))
+            if creator:
+                invite_set.discard(creator)
+            if invite_set:
+                data['invite'] = list(invite_set)
+
+            # Build power_level_content_override
+            if module.params['power_level_content_override']:
+                # Raw override takes precedence
+                data['power_level_content_override'] = module.params['power_level_content_override']
+            elif admins or moderators:
+                # Build from convenience params; admins are merged last so a
+                # user listed as both keeps power level 100
+                users_power = {**dict.fromkeys(moderators, 50), **dict.fromkeys(admins, 100)}
+                data['power_level_content_override'] = {
+                    "users": users_power,
+                    "users_default": 0,
+                }
+
+            # Guest access (initial_state event)
+            guest_access = module.params['guest_access']
+            if guest_access:
+                data.setdefault('initial_state', []).append({
+                    "type": "m.room.guest_access",
+                    "state_key": "",
+                    "content": {"guest_access": guest_access},
+                })
+
+            resp = create_room(api, data)
+
+            existing_id = None
+            if (skip_lookup and isinstance(resp['body'], dict)
+                    and resp['body'].get('errcode') == 'M_ROOM_IN_USE'):
+                # The alias room_id names is taken, so the room already exists
+                # (unless room_id is on another server and doesn't resolve)
+                existing_id = resolve_room_alias(api, original_room_id)
+
+            if resp['status_code'] == 200:
                 result['changed'] = True
+                result['room'] = resp['body']
+                result['power_levels_applied'] = 'power_level_content_override' in data
+            elif existing_id:
+                result['room'] = classify_room(api, existing_id, True)[1]
             else:
-                preset = module.params['preset']
-                data = {
-                    "visibility": "private" if preset != "public_chat" else "public",
-                    "preset": preset,
-                }
-                if module.params['room_name']:
-                    data['name'] = module.params['room_name']
-                if module.params['room_alias_name']:
-                    data['room_alias_name'] = module.params['room_alias_name']
-                if module.params['topic']:
-                    data['topic'] = module.params['topic']
-
-                # Determine the creating user so we can exclude from invites
-                creator = get_whoami(module, module.params['homeserver_url'],
-                                    module.params['access_token'])
-
-                # Build invite list: explicit + admins + moderators (deduplicated)
-                # Exclude the creator — they're already in the room
-                invite_set = set(module.params['invite'] or [])
-                admins = module.params['admins'] or []
-                moderators = module.params['moderators'] or []
-                invite_set.update(admins)
-                invite_set.update(moderators)
-                if creator:
-                    invite_set.discard(creator)
-                if invite_set:
-                    data['invite'] = list(invite_set)
-
-                # Build power_level_content_override
-                if module.params['power_level_content_override']:
-                    # Raw override takes precedence
-                    data['power_level_content_override'] = module.params['power_level_content_override']
-                elif admins or moderators:
-                    # Build from convenience params
-                    users_power = {}
-                    for user in admins:
-                        users_power[user] = 100
-                    for user in moderators:
-                        users_power[user] = 50
-                    data['power_level_content_override'] = {
-                        "users": users_power,
-                        "users_default": 0,
-                    }
-
-                # Guest access (initial_state event)
-                guest_access = module.params['guest_access']
-                if guest_access:
-                    data.setdefault('initial_state', []).append({
-                        "type": "m.room.guest_access",
-                        "state_key": "",
-                        "content": {"guest_access": guest_access},
-                    })
-
-                resp = create_room(
-                    module,
-                    module.params['homeserver_url'],
-                    module.params['access_token'],
-                    data,
+                module.fail_json(
+                    msg=f"Failed to create room: HTTP {resp['status_code']}",
+                    status_code=resp['status_code'],
+                    response=resp['body'],
+                    url=resp.get('url', ''),
                 )
 
-                if resp['status_code'] == 200:
-                    result['changed'] = True
-                    result['room'] = resp['body']
-                    result['power_levels_applied'] = 'power_level_content_override' in data
-                else:
-                    module.fail_json(
-                        msg=f"Failed to create room: HTTP {resp['status_code']}",
-                        status_code=resp['status_code'],
-                        response=resp['body'],
-                        url=resp.get('url', ''),
-                    )
-
     # Return updated token if re-authentication occurred
     result['access_token'] = api.access_token
     result['reauthenticated'] = api.reauthenticated
 
+    api.close()
     module.exit_json(**result)
 
 
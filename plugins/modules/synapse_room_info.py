@@ -39,6 +39,12 @@ options:
         description: Maximum number of rooms to return
         type: int
         default: 100
+    prefetch_details:
+        description: >-
+            When listing rooms, replace each entry with the full room
+            details. The detail lookups run concurrently.
+        type: bool
+        default: false
     validate_certs:
         description: Validate SSL certificates
         type: bool
@@ -89,27 +95,42 @@ total:
     returned: success
 '''
 
+import re
+from urllib.parse import quote, urlencode, urlsplit
+
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.jackaltx.solti_matrix_mgr.plugins.module_utils.matrix_api import (
     MatrixAdminAPI,
+    bulk_apply,
 )
 
 
-def resolve_room_alias(api, room_alias, homeserver):
-    """Resolve room alias to room ID."""
+# Aliases made only of these characters need nothing but '#' and ':' escaped
+_SAFE_ALIAS_RE = re.compile(r'[A-Za-z0-9._~:#-]+\Z')
+_ALIAS_ESCAPES = str.maketrans({'#': '%23', ':': '%3A'})
+
+
+def _encode_alias(room_alias, homeserver):
+    """Normalize a room alias and URL-encode it as a path segment."""
     # Normalize alias format
     if not room_alias.startswith('#'):
         room_alias = f"#{room_alias}:{homeserver}"
     elif ':' not in room_alias:
         room_alias = f"{room_alias}:{homeserver}"
 
-    # URL encode the alias
-    import urllib.parse
-    encoded_alias = urllib.parse.quote(room_alias, safe='')
+    if _SAFE_ALIAS_RE.match(room_alias):
+        return room_alias.translate(_ALIAS_ESCAPES)
+    return quote(room_alias, safe='')
+
+
+def resolve_room_alias(api, room_alias, homeserver):
+    """Resolve room alias to room ID."""
+    encoded_alias = _encode_alias(room_alias, homeserver)
 
     resp = api.get(f"directory/room/{encoded_alias}", api_version="client")
 
-    if resp['status_code'] == 200:
+    # A malformed body decodes to something other than a dict
+    if resp['status_code'] == 200 and isinstance(resp['body'], dict):
         return resp['body'].get('room_id')
     return None
 
@@ -123,17 +144,19 @@ def get_room_details(api, room_id):
     return None
 
 
-def run_module():
-    module_args = dict(
-        homeserver_url=dict(type='str', required=True),
-        access_token=dict(type='str', required=True, no_log=True),
-        room_id=dict(type='str'),
-        room_alias=dict(type='str'),
-        search_term=dict(type='str'),
-        limit=dict(type='int', default=100),
-        validate_certs=dict(type='bool', default=True),
-    )
+_MODULE_ARGS = dict(
+    homeserver_url=dict(type='str', required=True),
+    access_token=dict(type='str', required=True, no_log=True),
+    room_id=dict(type='str'),
+    room_alias=dict(type='str'),
+    search_term=dict(type='str'),
+    limit=dict(type='int', default=100),
+    prefetch_details=dict(type='bool', default=False),
+    validate_certs=dict(type='bool', default=True),
+)
+
 
+def run_module():
     result = dict(
         changed=False,
         rooms=[],
@@ -141,7 +164,7 @@ def run_module():
     )
 
     module = AnsibleModule(
-        argument_spec=module_args,
+        argument_spec=_MODULE_ARGS,
         supports_check_mode=True,
         mutually_exclusive=[
             ['room_id', 'room_alias'],
@@ -155,21 +178,25 @@ def run_module():
         module.params['validate_certs'],
     )
 
+    room_id = module.params['room_id']
+    room_alias = module.params['room_alias']
+    search_term = module.params['search_term']
+
     # Extract homeserver domain from URL
-    homeserver = module.params['homeserver_url'].split('//')[-1].split(':')[0]
+    homeserver = urlsplit(module.params['homeserver_url']).hostname
 
     # If specific room_id provided
-    if module.params['room_id']:
-        room = get_room_details(api, module.params['room_id'])
+    if room_id:
+        room = get_room_details(api, room_id)
         if room:
             result['rooms'] = [room]
             result['total'] = 1
         else:
-            module.fail_json(msg=f"Room not found: {module.params['room_id']}")
+            module.fail_json(msg=f"Room not found: {room_id}")
 
     # If room_alias provided, resolve it first
-    elif module.params['room_alias']:
-        room_id = resolve_room_alias(api, module.params['room_alias'], homeserver)
+    elif room_alias:
+        room_id = resolve_room_alias(api, room_alias, homeserver)
         if room_id:
             room = get_room_details(api, room_id)
             if room:
@@ -178,7 +205,7 @@ def run_module():
             else:
                 module.fail_json(msg=f"Room found but details unavailable: {room_id}")
         else:
-            module.fail_json(msg=f"Room alias not found: {module.params['room_alias']}")
+            module.fail_json(msg=f"Room alias not found: {room_alias}")
 
     # List all rooms
     else:
@@ -186,12 +213,10 @@ def run_module():
             'limit': module.params['limit'],
         }
 
-        if module.params['search_term']:
-            params['search_term'] = module.params['search_term']
+        if search_term:
+            params['search_term'] = search_term
 
-        # Build query string
-        query_params = '&'.join([f"{k}={v}" for k, v in params.items()])
-        endpoint = f"rooms?{query_params}"
+        endpoint = "rooms?" + urlencode(params, doseq=True)
 
         resp = api.get(endpoint)
 
@@ -199,9 +224,14 @@ def run_module():
             module.fail_json(msg=f"Failed to list rooms: {resp['body']}")
 
         rooms = resp['body'].get('rooms', [])
+        if module.params['prefetch_details'] and rooms:
+            # Rooms whose details can't be fetched keep their list entry
+            details = bulk_apply(api, [(get_room_details, (room['room_id'],), None) for room in rooms])
+            rooms = [detail or room for room, detail in zip(rooms, details)]
         result['rooms'] = rooms
         result['total'] = resp['body'].get('total', len(rooms))
 
+    api.close()
     module.exit_json(**result)
 
 
@@ -68,6 +68,16 @@ options:
             burst_count:
                 type: int
                 default: 0
+    force_update:
+        description: >-
+            With state=present, always send the create/update request, even
+            when the user already matches. changed is still reported from
+            comparing the user record before and after the write. For an
+            existing user the password is left out of the request, so a
+            forced run does not reset it (which would also log out the
+            user's devices); it is only sent when the user is created.
+        type: bool
+        default: false
     validate_certs:
         description: Validate SSL certificates
         type: bool
@@ -136,6 +146,7 @@ changed:
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.jackaltx.solti_matrix_mgr.plugins.module_utils.matrix_api import (
     MatrixAdminAPI,
+    bulk_apply,
     get_user_info,
     create_or_update_user,
     deactivate_user,
@@ -143,31 +154,33 @@ from ansible_collections.jackaltx.solti_matrix_mgr.plugins.module_utils.matrix_a
 )
 
 
-def run_module():
-    module_args = dict(
-        homeserver_url=dict(type='str', required=True),
-        access_token=dict(type='str', required=True, no_log=True),
-        admin_user=dict(type='str', required=False),
-        admin_password=dict(type='str', required=False, no_log=True),
-        user_id=dict(type='str', required=True),
-        state=dict(type='str', default='present', choices=['present', 'absent']),
-        password=dict(type='str', no_log=True),
-        displayname=dict(type='str'),
-        admin=dict(type='bool', default=False),
-        user_type=dict(type='str', choices=['bot', 'support']),
-        deactivated=dict(type='bool', default=False),
-        erase=dict(type='bool', default=False),
-        ratelimit_override=dict(type='dict'),
-        validate_certs=dict(type='bool', default=True),
-    )
+_MODULE_ARGS = dict(
+    homeserver_url=dict(type='str', required=True),
+    access_token=dict(type='str', required=True, no_log=True),
+    admin_user=dict(type='str', required=False),
+    admin_password=dict(type='str', required=False, no_log=True),
+    user_id=dict(type='str', required=True),
+    state=dict(type='str', default='present', choices=['present', 'absent']),
+    password=dict(type='str', no_log=True),
+    displayname=dict(type='str'),
+    admin=dict(type='bool', default=False),
+    user_type=dict(type='str', choices=['bot', 'support']),
+    deactivated=dict(type='bool', default=False),
+    erase=dict(type='bool', default=False),
+    ratelimit_override=dict(type='dict'),
+    force_update=dict(type='bool', default=False),
+    validate_certs=dict(type='bool', default=True),
+)
+
 
+def run_module():
     result = dict(
         changed=False,
         user={},
     )
 
     module = AnsibleModule(
-        argument_spec=module_args,
+        argument_spec=_MODULE_ARGS,
         supports_check_mode=True
     )
 
@@ -182,6 +195,14 @@ def run_module():
 
     user_id = module.params['user_id']
     state = module.params['state']
+    displayname = module.params['displayname']
+    admin = module.params['admin']
+    user_type = module.params['user_type']
+    deactivated = module.params['deactivated']
+    check_mode = module.check_mode
+    ratelimit_call = None
+    # Set when a write response already holds the final user record
+    user_body_fresh = False
 
     # Get current user state
     current_user = get_user_info(api, user_id)
@@ -191,7 +212,7 @@ def run_module():
 
     if state == 'absent':
         if current_user and not current_user.get('deactivated', False):
-            if module.check_mode:
+            if check_mode:
                 result['changed'] = True
             else:
                 resp = deactivate_user(api, user_id, erase=module.params['erase'])
@@ -201,63 +222,84 @@ def run_module():
                     module.fail_json(msg=f"Failed to deactivate user: {resp['body']}")
 
     elif state == 'present':
-        needs_update = False
-
         if current_user is None:
             needs_update = True
         else:
-            # Check if any attributes differ
-            if module.params['displayname'] and current_user.get('displayname') != module.params['displayname']:
-                needs_update = True
-            if current_user.get('admin', False) != module.params['admin']:
-                needs_update = True
-            if module.params['user_type'] is not None and current_user.get('user_type') != module.params['user_type']:
-                needs_update = True
-            if current_user.get('deactivated', False) != module.params['deactivated']:
-                needs_update = True
+            # (desired, actual) pairs; a desired value of None is left unmanaged
+            needs_update = any(
+                want is not None and want != have
+                for want, have in (
+                    (displayname or None, current_user.get('displayname')),
+                    (admin, current_user.get('admin', False)),
+                    (user_type, current_user.get('user_type')),
+                    (deactivated, current_user.get('deactivated', False)),
+                )
+            )
 
-        if needs_update:
-            if module.check_mode:
+        # A forced update writes even a matching user, but never resets an
+        # existing user's password
+        force_update = module.params['force_update'] and not check_mode
+        password = module.params['password']
+        if force_update and not needs_update and current_user is not None:
+            password = None
+
+        if needs_update or force_update:
+            if check_mode:
                 result['changed'] = True
             else:
                 resp = create_or_update_user(
                     api,
                     user_id,
-                    password=module.params['password'],
-                    displayname=module.params['displayname'],
-                    admin=module.params['admin'],
-                    user_type=module.params['user_type'],
-                    deactivated=module.params['deactivated'],
+                    password=password,
+                    displayname=displayname,
+                    admin=admin,
+                    user_type=user_type,
+                    deactivated=deactivated,
                 )
                 if resp['status_code'] in [200, 201]:
-                    result['changed'] = True
                     result['user'] = resp['body']
+                    # The PUT answers with the full user record
+                    user_body_fresh = isinstance(resp['body'], dict) and 'name' in resp['body']
+                    if needs_update or not user_body_fresh:
+                        result['changed'] = True
+                    else:
+                        # Forced write: changed only if the record differs from before
+                        result['changed'] = any(
+                            current_user.get(field) != resp['body'].get(field)
+                            for field in ('displayname', 'admin', 'user_type', 'deactivated')
+                        )
                 else:
                     module.fail_json(msg=f"Failed to create/update user: {resp['body']}")
 
-        # Handle rate limit override
+        # Handle rate limit override (sent together with the final fetch below)
         if module.params['ratelimit_override'] is not None:
             rl = module.params['ratelimit_override']
-            if not module.check_mode:
-                resp = set_ratelimit_override(
-                    api,
-                    user_id,
-                    messages_per_second=rl.get('messages_per_second', 0),
-                    burst_count=rl.get('burst_count', 0),
-                )
-                if resp['status_code'] != 200:
-                    module.warn(f"Failed to set rate limit override: {resp['body']}")
+            ratelimit_call = (set_ratelimit_override, (user_id,), {
+                'messages_per_second': rl.get('messages_per_second', 0),
+                'burst_count': rl.get('burst_count', 0),
+            })
 
-    # Fetch final state
-    if not module.check_mode:
-        final_user = get_user_info(api, user_id)
-        if final_user and not isinstance(final_user, dict) or 'error' not in final_user:
-            result['user'] = final_user
+    # Fetch final state unless the write already returned it. The rate limit
+    # override doesn't show up in the user record, so it can be set
+    # concurrently.
+    if not check_mode:
+        fetch_final = not user_body_fresh
+        operations = [(get_user_info, (user_id,), None)] if fetch_final else []
+        if ratelimit_call:
+            operations.append(ratelimit_call)
+        responses = bulk_apply(api, operations)
+        if ratelimit_call and responses[-1]['status_code'] != 200:
+            module.warn(f"Failed to set rate limit override: {responses[-1]['body']}")
+        if fetch_final:
+            final_user = responses[0]
+            if final_user is not None and 'error' not in final_user:
+                result['user'] = final_user
 
     # Return updated token if re-authentication occurred
     result['access_token'] = api.access_token
     result['reauthenticated'] = api.reauthenticated
 
+    api.close()
     module.exit_json(**result)
 
 
@@ -41,7 +41,13 @@ options:
         type: bool
         default: false
     limit:
-        description: Maximum number of users to return
+        description: >-
+            Maximum number of users to return. Further pages are fetched
+            until this many users match the filters or the list ends.
+            With I(user_type) on a server that ignores the C(user_types)
+            filter (Synapse before 1.107), users are filtered by the module
+            and at most 10 pages are scanned; a warning is issued in that
+            case, and when the page cap cut the scan short.
         type: int
         default: 100
     validate_certs:
@@ -107,21 +113,26 @@ from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.jackaltx.solti_matrix_mgr.plugins.module_utils.matrix_api import (
     MatrixAdminAPI,
     get_user_info,
+    paginate,
 )
 
 
-def run_module():
-    module_args = dict(
-        homeserver_url=dict(type='str', required=True),
-        access_token=dict(type='str', required=True, no_log=True),
-        user_id=dict(type='str'),
-        user_type=dict(type='str', choices=['bot', 'support', 'normal']),
-        admin=dict(type='bool'),
-        deactivated=dict(type='bool', default=False),
-        limit=dict(type='int', default=100),
-        validate_certs=dict(type='bool', default=True),
-    )
+# Pages scanned at most while filtering user_type client-side
+MAX_FILTER_PAGES = 10
+
+_MODULE_ARGS = dict(
+    homeserver_url=dict(type='str', required=True),
+    access_token=dict(type='str', required=True, no_log=True),
+    user_id=dict(type='str'),
+    user_type=dict(type='str', choices=['bot', 'support', 'normal']),
+    admin=dict(type='bool'),
+    deactivated=dict(type='bool', default=False),
+    limit=dict(type='int', default=100),
+    validate_certs=dict(type='bool', default=True),
+)
+
 
+def run_module():
     result = dict(
         changed=False,
         users=[],
@@ -129,7 +140,7 @@ def run_module():
     )
 
     module = AnsibleModule(
-        argument_spec=module_args,
+        argument_spec=_MODULE_ARGS,
         supports_check_mode=True
     )
 
@@ -140,50 +151,73 @@ def run_module():
         module.params['validate_certs'],
     )
 
+    user_id = module.params['user_id']
+    user_type = module.params['user_type']
+    admin = module.params['admin']
+    limit = module.params['limit']
+
     # If specific user_id provided, get single user
-    if module.params['user_id']:
-        user = get_user_info(api, module.params['user_id'])
-        if user and not isinstance(user, dict) or 'error' not in user:
-            result['users'] = [user]
-            result['total'] = 1
-        elif isinstance(user, dict) and 'error' in user:
-            module.fail_json(msg=f"Failed to get user info: {user['error']}")
-        else:
+    if user_id:
+        # None means the user doesn't exist; errors come back as {'error': ...}
+        user = get_user_info(api, user_id)
+        if user is None:
             result['users'] = []
             result['total'] = 0
+        elif 'error' in user:
+            module.fail_json(msg=f"Failed to get user info: {user['error']}")
+        else:
+            result['users'] = [user]
+            result['total'] = 1
     else:
         # List users with filters
         params = {
-            'limit': module.params['limit'],
             'deactivated': 'true' if module.params['deactivated'] else 'false',
         }
 
         # Add admin filter if specified
-        if module.params['admin'] is not None:
-            params['admins'] = 'true' if module.params['admin'] else 'false'
-
-        # Build query string
-        query_params = '&'.join([f"{k}={v}" for k, v in params.items()])
-        endpoint = f"users?{query_params}"
-
-        resp = api.get(endpoint, api_version="v2")
-
-        if resp['status_code'] != 200:
-            module.fail_json(msg=f"Failed to list users: {resp['body']}")
-
-        users = resp['body'].get('users', [])
-
-        # Apply user_type filter (API doesn't support filtering normal users directly)
-        if module.params['user_type']:
-            if module.params['user_type'] == 'normal':
-                # Normal users have user_type == null
-                users = [u for u in users if u.get('user_type') is None]
-            else:
-                users = [u for u in users if u.get('user_type') == module.params['user_type']]
+        if admin is not None:
+            params['admins'] = 'true' if admin else 'false'
+
+        # Let the server filter by type (Synapse 1.107+; an empty string
+        # selects normal users). Older servers ignore the parameter.
+        if user_type:
+            params['user_types'] = [''] if user_type == 'normal' else [user_type]
+
+        # Normal users have user_type == null; the target is looked up
+        # once instead of per user
+        target = None if user_type == 'normal' else user_type
+
+        # Page through until limit users pass the filter (or pages run out)
+        users = []
+        filter_ignored = False
+        for page_count, page in enumerate(paginate(api, "users", params, page_size=limit, api_version="v2"), 1):
+            if page['status_code'] != 200:
+                module.fail_json(msg=f"Failed to list users: {page['body']}")
+
+            page_users = page['body'].get('users', [])
+            # Apply user_type filter again for servers that ignored user_types
+            if user_type:
+                matching = [u for u in page_users if u.get('user_type') == target]
+                filter_ignored = filter_ignored or len(matching) < len(page_users)
+                page_users = matching
+            users.extend(page_users)
+            if len(users) >= limit:
+                del users[limit:]
+                break
+            if filter_ignored and page_count >= MAX_FILTER_PAGES:
+                # Only a fraction of each page matches: don't walk the whole user list
+                module.warn(f"Stopped after {page_count} pages with {len(users)} of {limit} users; "
+                            "narrow the query or upgrade Synapse for server-side user_type filtering")
+                break
+
+        if filter_ignored:
+            module.warn("The server ignored the user_types filter (Synapse before 1.107); "
+                        "users were filtered by the module")
 
         result['users'] = users
         result['total'] = len(users)
 
+    api.close()
     module.exit_json(**result)
 
 